@@ -3,17 +3,17 @@ import mesa
 from mesa.datacollection import DataCollector
 
 from mesa.agent import Agent
-from mesa.time import RandomActivation
+from mesa.time import BaseScheduler
 import numpy as np
 import pandas as pd
 
 import warnings
 warnings.filterwarnings('ignore')
-import random
 
-import LEM_utils.Utils as Utils
-from LEM_utils.tariff_utils import tariff_rate_for_timestamp
+import LEM_utils.Utils as Utils
+from LEM_utils.tariff_utils import tariff_rate_for_timestamp
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 
 import pymarket as pm
@@ -63,7 +63,7 @@ class LEMAgent(mesa.Agent, Member):
     LEMAgent handles simulation and interaction in the environment.
     Member handles energy community modeling (states, assets)."""
 
-    def __init__(self, model: LEMCommunity, member: Member):
+    def __init__(self, model: LEMCommunity, member: Member, num_steps: int):
         unique_id = member.member_id
         super().__init__(unique_id, model)
         self.agent_id = unique_id  # Unique identifier for the agent
@@ -73,22 +73,27 @@ class LEMAgent(mesa.Agent, Member):
         self.traded_quantity = 0  # Clearing quantity after market clearing
         self.traded_price = 0  # Clearing price after market clearing
         self.buying = False  # True if the member is buying, False if selling
-        self.market_states=[]    # List to store market states (time_step, bid_quantity, bid_price, buying)
-        self.trading_states=[]  # List to store trading states (time_step, traded_quantity, traded_price)
-        self.agent_market_states = pd.DataFrame()  # DataFrame to store aggregated market states
+        # Market and trading states, preallocated and indexed by step
+        self.offered = np.zeros(num_steps, dtype=bool)  # True for steps where the agent posted an offer
+        self.bid_quantities = np.zeros(num_steps)
+        self.bid_prices = np.zeros(num_steps)
+        self.buying_flags = np.zeros(num_steps, dtype=bool)
+        self.traded_quantities = np.zeros(num_steps)
+        self.traded_prices = np.zeros(num_steps)
+        self.agent_market_states = None  # DataFrame of aggregated market states, built by aggregate_agent_market_states
         self.current_step = 0  # Current step index in the simulation
         self.time_step = None  # Current time step in the simulation
 
-    def step(self, market: pm.Market):
-        # Called by the model at each time step
-        self.time_step = self.model.current_time
-        self.current_step = self.model.time_index  # Get the current step index
-        # Get prices
-        TOU = tariff_rate_for_timestamp(self.model.TOU, self.time_step, price_col="tou")
-        FIT = tariff_rate_for_timestamp(self.model.FIT, self.time_step, price_col="fit")
-        PU_avg = (TOU + FIT) / 2
-        # Generate market offer
-        self.generate_market_offer( market, TOU, PU_avg, FIT)
+    def step(self, market: pm.Market):
+        # Called by the model at each time step
+        self.time_step = self.model.current_time
+        self.current_step = self.model.time_index  # Get the current step index
+        # Get prices (precomputed by the model for each time step)
+        TOU = self.model.tou_rates[self.current_step]
+        FIT = self.model.fit_rates[self.current_step]
+        PU_avg = self.model.pu_avg_rates[self.current_step]
+        # Generate market offer
+        self.generate_market_offer( market, TOU, PU_avg, FIT)
 
     def generate_market_offer(self, market, TOU, PU_avg, FIT):
         self.state=self.member.get_state(self.time_step)  # Get the member's state at the current time step (df row)
@@ -97,43 +102,77 @@ class LEMAgent(mesa.Agent, Member):
         self.net_balance = self.state['net_balance'].iloc[0]  # Get net balance from the state
         if self.net_balance < 0:  # deficit
             self.bid_quantity = -self.net_balance  # Quantity to buy
-            self.bid_price = round(random.uniform(PU_avg*0.8, TOU *0.99), 2)
+            self.bid_price = round(self.model.rng.uniform(PU_avg*0.8, TOU *0.99), 2)
             self.bid_price=np.clip(self.bid_price, FIT, TOU)  # Ensure bid price is within bounds
             self.buying = True  # Set buying flag
             # Offer to buy in the market
             market.accept_bid(self.bid_quantity, self.bid_price, self.agent_id, True)  # buyer
         else:
             self.bid_quantity = self.net_balance  # Quantity to sell
-            self.bid_price = round(random.uniform(FIT*1.1, PU_avg*1.2), 2)
+            self.bid_price = round(self.model.rng.uniform(FIT*1.1, PU_avg*1.2), 2)
             self.bid_price=np.clip(self.bid_price, FIT, TOU)  # Ensure bid price is within bounds
             self.buying = False  # Set buying flag to False
             # Offer to sell in the market
             market.accept_bid(self.bid_quantity, self.bid_price, self.agent_id, False)  # seller
-        self.market_states.append([self.time_step, self.current_step, self.bid_quantity, self.bid_price, self.buying])  # Append to market states
+        self.store_market_state()
         #print(f"Agent {self.agent_id} offers quantity {self.bid_quantity} at price {self.bid_price} at time step {time_step}")
 
+    def record_market_offer(self, net_balance, bid_quantity, bid_price, buying):
+        # Store an offer generated by the model for the current time step
+        self.time_step = self.model.current_time
+        self.current_step = self.model.time_index
+        self.state = self.member.get_state(self.time_step)  # Get the member's state at the current time step (df row)
+        self.net_balance = net_balance
+        self.bid_quantity = bid_quantity
+        self.bid_price = bid_price
+        self.buying = buying
+        self.store_market_state()
+
+    def load_market_state(self, step_index):
+        # Restore the offer stored for `step_index` as the current offer
+        self.current_step = step_index
+        self.time_step = self.model.time_steps[step_index]
+        self.bid_quantity = self.bid_quantities[step_index]
+        self.bid_price = self.bid_prices[step_index]
+        self.buying = self.buying_flags[step_index]
+
+    def store_market_state(self):
+        # Store the current offer at the current step index
+        i = self.current_step
+        self.offered[i] = True
+        self.bid_quantities[i] = self.bid_quantity
+        self.bid_prices[i] = self.bid_price
+        self.buying_flags[i] = self.buying
+
     def process_market_result(self, time_step, traded_quantity, traded_price):
         # Update state based on market clearing
         self.time_step = time_step  # Update the time step
         self.traded_quantity = traded_quantity  # Quantity traded in the market
         self.traded_price = traded_price  # Price at which the trade occurred
-        self.trading_states.append([self.time_step, self.traded_quantity, self.traded_price])  # Append to market states
+        self.traded_quantities[self.model.time_index] = self.traded_quantity
+        self.traded_prices[self.model.time_index] = self.traded_price
 
     def aggregate_agent_market_states(self):
         """Aggregate market states into a DataFrame."""
-        self.agent_market_states = pd.DataFrame(self.market_states, columns=['time_step', 'step', 'bid_quantity', 'bid_price', 'buying'])
-        self.agent_market_states['agent_id'] = self.agent_id
-        df_trading = pd.DataFrame(self.trading_states, columns=['time_step', 'traded_quantity', 'traded_price'])
-        self.agent_market_states = self.agent_market_states.merge(df_trading, on='time_step', how='left')
-        self.agent_market_states['time_step'] = pd.to_datetime(self.agent_market_states['time_step'])  # Convert time_step to datetime
-        self.agent_market_states.fillna({'traded_quantity': 0, 'traded_price': 0}, inplace=True)  # Fill NaN values
+        steps = np.flatnonzero(self.offered)  # Steps where the agent posted an offer
+        self.agent_market_states = pd.DataFrame({
+            'time_step': self.model.time_steps_index[steps],
+            'step': steps,
+            'bid_quantity': self.bid_quantities[steps],
+            'bid_price': self.bid_prices[steps],
+            'buying': self.buying_flags[steps],
+            'agent_id': self.agent_id,
+            'traded_quantity': self.traded_quantities[steps],  # 0 where the agent did not trade
+            'traded_price': self.traded_prices[steps]
+        })
         return self.agent_market_states
 
 class LEMCommunity(mesa.Model):
-    def __init__(self, EC: EnergyCommunity, time_window: tuple = None, target_date: pd.Timestamp.date = None):
+    def __init__(self, EC: EnergyCommunity, time_window: tuple = None, target_date: pd.Timestamp.date = None, seed: int = None):
         super().__init__()
+        self.rng = np.random.default_rng(seed)  # Random generator for bid prices, seeded for reproducible runs
         self.num_agents = len(EC.members)
-        self.schedule = mesa.time.RandomActivation(self)
+        self.schedule = BaseScheduler(self)  # Agents are only kept for iteration, offers are generated in one vectorized pass
         self.has_market=False
         self.market = pm.Market() 
         self.market_states=EC.compute_community_states()
@@ -152,14 +191,28 @@ class LEMCommunity(mesa.Model):
             print(f"Filtered time steps to {len(self.time_steps)} intervals based on time_window={time_window}")
         
         if target_date is not None: #target_date = pd.Timestamp("2025-06-06").date()
-            self.time_steps = [
-                ts for ts in self.time_steps if ts.date() == target_date]
+            idx = pd.DatetimeIndex(self.time_steps)
+            self.time_steps = idx[idx.date == target_date].tolist()
+
+        # Tariffs are shared by all agents, so look them up once per time step
+        self.tou_rates = np.array([tariff_rate_for_timestamp(self.TOU, ts, price_col="tou") for ts in self.time_steps])
+        self.fit_rates = np.array([tariff_rate_for_timestamp(self.FIT, ts, price_col="fit") for ts in self.time_steps])
+        self.pu_avg_rates = (self.tou_rates + self.fit_rates) / 2
+        # Time steps as datetimes, converted once and indexed by step when building state tables
+        self.time_steps_index = pd.to_datetime(self.time_steps)
 
         for i in range(self.num_agents):
-            agent = LEMAgent(self, EC.members[i])  # Create a LEMAgent for each member
+            agent = LEMAgent(self, EC.members[i], len(self.time_steps))  # Create a LEMAgent for each member
             self.schedule.add(agent)
             print(f"Added agent {agent.agent_id} of type {agent.member.member_type} with assets: {[asset.asset_name for asset in agent.member.assets]}")
 
+        self.agents_by_id = {agent.agent_id: agent for agent in self.schedule.agents}  # Agent lookup for market results
+
+        # Net balance of every agent at every time step [step_index, agent_index], in schedule order
+        self.net_balance_panel = np.array(
+            [[agent.member.get_state(ts)['net_balance'].iloc[0] for agent in self.schedule.agents] for ts in self.time_steps],
+            dtype=float).reshape(len(self.time_steps), self.num_agents)
+
         self.datacollector = DataCollector(
             agent_reporters={"agent_id":lambda agent: agent.agent_id, 
                              "time_step": lambda agent: agent.time_step,
@@ -174,16 +227,40 @@ class LEMCommunity(mesa.Model):
            end_time = datetime.time(22, 0)
            """
         start, end = time_window
-        filtered_steps = []
-        for ts in self.time_steps:
-            ts_time = ts.time() if isinstance(ts, pd.Timestamp) else ts
-            if start <= ts_time <= end:
-                filtered_steps.append(ts)
-        return filtered_steps
+
+        def time_of_day(t):
+            return (t.hour*60 + t.minute)*60 + t.second + t.microsecond/1e6
+
+        # Compare all time steps at once on their wall-clock time, not the time elapsed
+        # since midnight, which is off by an hour on DST transition days
+        idx = pd.DatetimeIndex(self.time_steps)
+        wall_clock = time_of_day(idx)
+        mask = (wall_clock >= time_of_day(start)) & (wall_clock <= time_of_day(end))
+        return idx[mask].tolist()
 
     @property
     def current_time(self):
         return self.time_steps[self.time_index]
+
+    def _collect_net_balances(self):
+        """Net balance of every agent at the current time step, in schedule order."""
+        return self.net_balance_panel[self.time_index]
+
+    def generate_market_offers(self):
+        """Generates the offers of all agents in one vectorized pass and submits them to the market.
+           Agents in deficit buy between 0.8*PU_avg and 0.99*TOU, the others sell between 1.1*FIT and 1.2*PU_avg."""
+        TOU = self.tou_rates[self.time_index]
+        FIT = self.fit_rates[self.time_index]
+        PU_avg = self.pu_avg_rates[self.time_index]
+        net_balance = self._collect_net_balances()
+        buying = net_balance < 0  # deficit
+        bid_quantity = np.abs(net_balance)
+        low = np.where(buying, PU_avg*0.8, FIT*1.1)
+        high = np.where(buying, TOU*0.99, PU_avg*1.2)
+        bid_price = np.clip(np.round(self.rng.uniform(low, high), 2), FIT, TOU)  # Ensure bid prices are within bounds
+        for k, agent in enumerate(self.schedule.agents):
+            agent.record_market_offer(net_balance[k], bid_quantity[k], bid_price[k], bool(buying[k]))
+            self.market.accept_bid(bid_quantity[k], bid_price[k], agent.agent_id, bool(buying[k]))
     def set_pricing_mechanism(self, pricing_mechanism: str):
         """Sets the pricing mechanism for the market clearing.
            pricing_mechanism: 'uniform' or 'AUP' (adjusted uniform price) or other extended mechanisms."""
@@ -195,31 +272,44 @@ class LEMCommunity(mesa.Model):
     def step(self):
         self.market = pm.Market()
         print(f"Current step {self.time_index} and time step: {self.current_time}")
-        log = {"step": self.time_index, "time": str(self.current_time), "events": [], "extras":[]}
-        log["events"].append(f"Current step {self.time_index} and time step: {self.current_time}")
-        # For each agent, call their step method with self.market
-        for agent in self.schedule.agents:
-            agent.step(self.market)
+        # Collect the offers of all agents in the market
+        self.generate_market_offers()
         # Run market clearing only if there are agents with surplus
+        self.record_step(*self.clear_market(self.market, self.time_index))
+
+    def clear_market(self, market: pm.Market, step_index: int):
+        """Runs the clearing of a market holding the offers of time step `step_index`.
+           Returns (number of prosumers with surplus, transactions, extras); transactions and
+           extras are None when there is no surplus. Does not modify the model."""
         # Check for agents with surplus
-        agents_with_surplus = [agent for agent in self.schedule.agents if agent.net_balance > 0]
-        if agents_with_surplus:
-            print(f"There are {len(agents_with_surplus)} prosumers with surplus in this step.")
-            log["events"].append(f"There are {len(agents_with_surplus)} prosumers with surplus in this step.")
+        n_surplus = int((self.net_balance_panel[step_index] > 0).sum())
+        if n_surplus == 0:
+            return n_surplus, None, None
+        transactions, extras = market.run(self.pricing_mechanism)
+        return n_surplus, transactions, extras
+
+    def record_step(self, n_surplus, transactions, extras):
+        """Records the clearing result of the current time step and advances to the next one."""
+        log = {"step": self.time_index, "time": str(self.current_time), "events": [], "extras":[]}
+        log["events"].append(f"Current step {self.time_index} and time step: {self.current_time}")
+        if transactions is not None:
+            print(f"There are {n_surplus} prosumers with surplus in this step.")
+            log["events"].append(f"There are {n_surplus} prosumers with surplus in this step.")
             self.has_market = True
-            # Run the market
-            self.transactions, self.extras = self.market.run(self.pricing_mechanism)
+            self.transactions, self.extras = transactions, extras
             df_transactions=self.transactions.get_df()
             total_traded_quantity = df_transactions['quantity'].sum() if not df_transactions.empty else 0
             
             
+            # Traded quantity (sum) and price (first transaction) per bid, computed once
+            traded_by_bid = df_transactions.groupby('bid', sort=False).agg(
+                quantity=('quantity', 'sum'), price=('price', 'first'))
             # Process market results for each agent
-            for agent in self.schedule.agents:
-                if agent.agent_id in df_transactions['bid'].values:
-                    # If the agent is in the transactions, get the traded quantity and price for the agent
-                    traded_quantity = df_transactions.loc[df_transactions['bid'] == agent.agent_id, 'quantity'].sum()
-                    traded_price = df_transactions.loc[df_transactions['bid'] == agent.agent_id, 'price'].values[0]
-                    agent.process_market_result(self.current_time, traded_quantity, traded_price)               
+            for bid_id, traded_quantity, traded_price in traded_by_bid.itertuples(index=True, name=None):
+                agent = self.agents_by_id.get(bid_id)
+                if agent is not None:
+                    # If the agent is in the transactions, pass the traded quantity and price to the agent
+                    agent.process_market_result(self.current_time, traded_quantity, traded_price)
             print(f"Market cleared at time step {self.current_time} with {len(df_transactions)} transactions and total traded quantity: {total_traded_quantity}")
             log["events"].append(f"Market cleared at time step {self.current_time} with {len(df_transactions)} transactions")
             log['extras'].append(self.extras)
@@ -238,17 +328,46 @@ class LEMCommunity(mesa.Model):
             log["events"].append("Simulation complete: all time steps processed.")
             self.time_index += 1  # force exit on the next loop
         self.step_logs.append(log)
+
+    def run_parallel(self, max_workers: int = None):
+        """Runs all remaining time steps, clearing the markets of the different steps in a thread pool.
+           This is only valid because offers come from the precomputed net balance panel and do not
+           depend on previous clearing outcomes. Offers are generated and results recorded in step order."""
+        step_indices = range(self.time_index, len(self.time_steps))
+        markets = []
+        for self.time_index in step_indices:
+            self.market = pm.Market()
+            self.generate_market_offers()
+            markets.append(self.market)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.clear_market, markets, step_indices))
+        for self.time_index, result in zip(step_indices, results):
+            print(f"Current step {self.time_index} and time step: {self.current_time}")
+            for agent in self.schedule.agents:
+                agent.load_market_state(self.time_index)  # So the data collector sees this step's offer
+            self.record_step(*result)
+
     def aggregate_market_states(self):
-        # Aggregate market states of all agents into a single DataFrame
-        for agent in self.schedule.agents:
-            agent.aggregate_agent_market_states()
-        self.all_market_states = pd.concat([a.agent_market_states for a in self.schedule.agents if not a.agent_market_states.empty])
-        self.all_market_states.rename(columns={'time_step':'Timestamp', 'agent_id':'member_id'}, inplace=True)
-        self.all_market_states['traded_deficit'] = 0  # Initialize column
-        self.all_market_states.loc[self.all_market_states['buying'] == True, 'traded_deficit'] = \
-        self.all_market_states.loc[self.all_market_states['buying'] == True, 'traded_quantity']
-        self.all_market_states['traded_surplus']=0
-        self.all_market_states.loc[self.all_market_states['buying'] == False, 'traded_surplus'] = \
-        self.all_market_states.loc[self.all_market_states['buying'] == False, 'traded_quantity']
+        # Aggregate market states of all agents into a single DataFrame, built in one pass
+        # from the per-step arrays of all agents stacked as [agent_index, step_index]
+        agents = self.schedule.agents
+        agent_idx, steps = np.nonzero(np.stack([agent.offered for agent in agents]))
+
+        def stacked(attr):
+            return np.stack([getattr(agent, attr) for agent in agents])[agent_idx, steps]
+
+        buying = stacked('buying_flags')
+        traded_quantity = stacked('traded_quantities')
+        self.all_market_states = pd.DataFrame({
+            'Timestamp': self.time_steps_index[steps],
+            'step': steps,
+            'bid_quantity': stacked('bid_quantities'),
+            'bid_price': stacked('bid_prices'),
+            'buying': buying,
+            'member_id': np.array([agent.agent_id for agent in agents])[agent_idx],
+            'traded_quantity': traded_quantity,
+            'traded_price': stacked('traded_prices'),
+            'traded_deficit': np.where(buying, traded_quantity, 0.0),
+            'traded_surplus': np.where(~buying, traded_quantity, 0.0)
+        })
         return self.all_market_states
-    
@@ -9,23 +9,25 @@ def adjusted_uniform_price_mechanism(bids: pd.DataFrame, *args, **kwargs):
     max_iterations = kwargs.pop('max_iterations', 10)
 
     results_log = []
-    current_bids = bids.copy()
     trans_all = pm.TransactionManager()
 
+    # Bid book as plain arrays, mutated in place between iterations
+    quantity = bids['quantity'].to_numpy(dtype=float, copy=True)
+    price = bids['price'].to_numpy(dtype=float, copy=True)
+    buying = bids['buying'].to_numpy(dtype=bool, copy=True)
+    bid_ids = bids.index.to_numpy().astype(int)
+    position = {bid_id: k for k, bid_id in enumerate(bid_ids)}
+
     for iteration in range(1, max_iterations + 1):
         print(f"AUP Iteration {iteration}")
 
         # Run uniform price mechanism
+        current_bids = pd.DataFrame({'quantity': quantity, 'price': price, 'buying': buying}, index=bid_ids)
         trans_iter, result = uniform_price_mechanism(current_bids)
-        df=trans_iter.get_df()
-        #print(f'transactions quantity: {df["quantity"].sum()}')
-        # Merge this iteration's transactions
-        for _, row in trans_iter.get_df().iterrows():
-            trans_all.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
 
         # Log current result
-        total_demand = current_bids[current_bids['buying']]['quantity'].sum()
-        total_supply = current_bids[~current_bids['buying']]['quantity'].sum()
+        total_demand = quantity[buying].sum()
+        total_supply = quantity[~buying].sum()
 
         results_log.append({
             "iteration": iteration,
@@ -35,34 +37,35 @@ def adjusted_uniform_price_mechanism(bids: pd.DataFrame, *args, **kwargs):
             "supply_quantity": total_supply
         })
 
+        # Merge this iteration's transactions and update remaining quantities
+        for transaction in trans_iter.trans:
+            trans_all.add_transaction(*transaction)
+            bid_index, traded = transaction[0], transaction[1]
+            quantity[position[bid_index]] -= traded
 
-        # Update remaining quantities
-        updated_bids = current_bids.copy()
-        for _, row in trans_iter.get_df().iterrows():
-            bid_index = row['bid']
-            quantity = row['quantity']
-            if bid_index in updated_bids.index:
-                updated_bids.loc[bid_index, 'quantity'] -= quantity
-        updated_bids.index = updated_bids.index.astype(int)
-
-        
-        unsold_quantity = updated_bids.loc[~updated_bids['buying'], 'quantity'].sum()
-        demanded_quantity = updated_bids.loc[updated_bids['buying'], 'quantity'].sum()
+        unsold_quantity = quantity[~buying].sum()
+        demanded_quantity = quantity[buying].sum()
         if unsold_quantity == 0 or demanded_quantity == 0:
             print("No unsold or demanded quantities left, breaking the loop.")
             break
         # Price adjustment
         #print(f'Adjusting prices for unsold bids: {unsold_quantity}, demanded bids: {demanded_quantity}')
-        updated_bids.loc[updated_bids['buying'], 'price'] = updated_bids.loc[updated_bids['buying'], 'price']*(1+step)
-        updated_bids.loc[~updated_bids['buying'], 'price'] =updated_bids.loc[~updated_bids['buying'], 'price']*(1-step)
-        
+        previous_price = price.copy()
+        price[buying] *= (1+step)
+        price[~buying] *= (1-step)
 
         # Enforce FIT/TOU constraints
-        updated_bids.loc[updated_bids['buying'], 'price'] = updated_bids.loc[updated_bids['buying'], 'price'].clip(lower=FIT, upper=TOU)
-        updated_bids.loc[~updated_bids['buying'], 'price'] = updated_bids.loc[~updated_bids['buying'], 'price'].clip(lower=FIT, upper=TOU)
+        np.clip(price, FIT, TOU, out=price)
+
+        # Nothing traded and all prices are stuck at FIT/TOU: every remaining iteration would
+        # clear this same bid book again, so log its result for them instead of rerunning it
+        if not trans_iter.trans and np.array_equal(price, previous_price):
+            print("No trades and prices did not change after the FIT/TOU limits, breaking the loop.")
+            for later in range(iteration + 1, max_iterations + 1):
+                results_log.append({**results_log[-1], "iteration": later})
+            break
 
-        current_bids = updated_bids.copy()
-    total_traded_quantity=round(trans_all.get_df()['quantity'].sum(), 4)
+    total_traded_quantity=round(sum(transaction[1] for transaction in trans_all.trans), 4)
     print(f'Final clearing price: {result["clearing price"]}, Final clearing quantity: {total_traded_quantity}')
     return trans_all, {
         'clearing quantity': total_traded_quantity,
@@ -1,46 +1,42 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-import itertools
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, signed_prices, greedy_match, add_transactions
 
 def cooperative_game_theory_shapley(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, cap: float, floor: float):
     """
     Cooperative Game Theory (CGT) with Shapley values for trading uncovered bids.
-    Uses full permutation-based Shapley value calculation.
-    Warning: Computationally expensive for large numbers of participants.
+    The welfare W(S) = sum of buying prices - sum of selling prices in S is
+    additive, so the exact Shapley value of each participant is its own
+    contribution: its price if buying, minus its price if selling.
     """
-    def calculate_welfare(bids):
-        return (bids.loc[bids['buying'], 'price'] - bids.loc[~bids['buying'], 'price']).sum()
+    shapley_values = signed_prices(bids_uncovered)
     
-    total_welfare = calculate_welfare(bids_uncovered)
-    shapley_values = {}
-    participants = list(bids_uncovered.index)
+    match_by_shapley(bids_uncovered, trans, shapley_values, cap, floor)
     
-    for p in participants:
-        marginal_contributions = []
-        for perm in itertools.permutations([x for x in participants if x != p]):
-            S = list(perm)
-            W_S = calculate_welfare(bids_uncovered.loc[S]) if S else 0
-            W_S_plus_p = calculate_welfare(bids_uncovered.loc[S + [p]])
-            marginal_contributions.append(W_S_plus_p - W_S)
-        
-        shapley_values[p] = sum(marginal_contributions) / len(marginal_contributions)
+    return bids_uncovered, shapley_values.mean()
+
+
+def match_by_shapley(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, shapley_values: np.ndarray, cap: float, floor: float):
+    """
+    Greedy matching of the uncovered buying and selling bids in bid order. Each
+    trade is priced at the mean Shapley value of its buyer and seller, limited
+    to [floor, cap]. Remaining quantities are updated in `bids_uncovered`.
+    """
+    buying = bids_uncovered['buying'].to_numpy(dtype=bool)
+    quantity = bids_uncovered['quantity'].to_numpy(dtype=float)
+    buy_positions = np.flatnonzero(buying)
+    sell_positions = np.flatnonzero(~buying)
     
-    for i, row in bids_uncovered.iterrows():
-        if row['buying']:
-            matching_sellers = bids_uncovered.loc[~bids_uncovered['buying']]
-            for j, seller in matching_sellers.iterrows():
-                price = max(floor, min((shapley_values[i] + shapley_values[j]) / 2, cap))
-                quantity = min(row['quantity'], seller['quantity'])
-                trans.add_transaction(i, quantity, price, -1, False)
-                trans.add_transaction(j, quantity, price, -1, False)
-                bids_uncovered.at[i, 'quantity'] -= quantity
-                bids_uncovered.at[j, 'quantity'] -= quantity
-                if bids_uncovered.at[i, 'quantity'] == 0:
-                    break
+    buy_trades, sell_trades, quantities = greedy_match(quantity[buy_positions], quantity[sell_positions])
+    buy_trades, sell_trades = buy_positions[buy_trades], sell_positions[sell_trades]
+    prices = np.maximum(floor, np.minimum((shapley_values[buy_trades] + shapley_values[sell_trades]) / 2, cap))
     
-    return bids_uncovered, sum(shapley_values.values()) / len(shapley_values)
+    # Buyer then seller transaction per trade
+    trade_bids = np.column_stack((bids_uncovered.index[buy_trades], bids_uncovered.index[sell_trades])).ravel().tolist()
+    add_transactions(trans, trade_bids, np.repeat(quantities, 2), np.repeat(prices, 2))
+    traded = np.bincount(np.concatenate((buy_trades, sell_trades)), weights=np.tile(quantities, 2), minlength=len(quantity))
+    bids_uncovered['quantity'] = quantity - traded
 
 
 def two_steps_CGT_mechanism(bids: pd.DataFrame, *args, **kwargs):
@@ -54,52 +50,11 @@ def two_steps_CGT_mechanism(bids: pd.DataFrame, *args, **kwargs):
     cap = kwargs.pop('cap', 100)
     floor = kwargs.pop('floor', 10)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: CGT
-    CGTq_ = 0
-    CGTprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
+    def step2(bids_uncovered, sides, trans, UPprice):
         bidsM, CGTprice = cooperative_game_theory_shapley(bids_uncovered, trans, cap, floor)
-        CGTq_ = bidsM.quantity.sum()
-    
-    if CGTq_ is None:
-        CGTq_ = 0
-    if CGTprice is None:
-        CGTprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'CGT quantity': CGTq_,
-        'CGT price': CGTprice,
-        'Total quantity': UPq_ + CGTq_
-    }
+        return bidsM.quantity.sum(), CGTprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'CGT quantity', 'CGT price')
 
 
 class CGT(pm.Mechanism):
@@ -119,9 +74,8 @@ class CGT(pm.Mechanism):
     floor
         Minimum price floor (default: 10).
     
-    Note: This mechanism uses full permutation-based Shapley value calculation
-    which is computationally expensive for large numbers of participants.
-    Consider using CGTS (simplified version) for better performance.
+    Note: Shapley values are exact and computed in closed form, since the
+    welfare of a coalition is additive over its participants.
     """
 
     def __init__(self, bids, *args, **kwargs):
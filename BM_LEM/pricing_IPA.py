@@ -1,53 +1,39 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, match_uncovered_bids
 
-def iterative_price_adjustment(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, theta: float, epsilon: float, MP: float, FIT: float, TOU: float):
+def converged_price(MP: float, step: float, lower: float, upper: float, epsilon: float):
+    """
+    Closed form of the price iteration p <- clip(p + step, lower, upper) started
+    at MP, which stops once an update moves the price by less than epsilon.
+    """
+    first_price = max(lower, min(MP + step, upper))
+    
+    if abs(first_price - MP) < epsilon:
+        # Converged before the first adjustment
+        return MP
+    if abs(step) < epsilon:
+        # Converged right after the first adjustment
+        return first_price
+    # Ramp towards the upper bound (the lower one for a negative step): the last full
+    # step is kept if the remaining partial step to the bound is below epsilon
+    bound = upper if step > 0 else lower
+    last_price = first_price + np.floor((bound - first_price) / step) * step
+    return last_price if abs(bound - last_price) < epsilon else bound
+
+
+def iterative_price_adjustment(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, theta: float, epsilon: float, MP: float, FIT: float, TOU: float, sides=None):
     """
     Iterative Price Adjustment (IPA) for trading uncovered bids.
     Iteratively adjusts price until convergence.
+    Each iteration adds the same step theta*(max price - min price)/2, clipped
+    to [FIT, TOU], so the converged price is computed in closed form.
     """
-    adjusted_price = MP
-    
-    while True:
-        new_price = adjusted_price + theta * ((bids_uncovered['price'].max() - adjusted_price) + (adjusted_price - bids_uncovered['price'].min())) / 2
-        new_price = max(FIT, min(new_price, TOU))
-        
-        if abs(new_price - adjusted_price) < epsilon:
-            break
-        
-        adjusted_price = new_price
-    
-    buying_bids = bids_uncovered.loc[bids_uncovered['buying']].sort_values('price', ascending=False)
-    selling_bids = bids_uncovered.loc[~bids_uncovered['buying']].sort_values('price', ascending=True)
-    
-    buying_quantity = buying_bids.quantity.sum()
-    selling_quantity = selling_bids.quantity.sum()
-    
-    if buying_quantity > selling_quantity:
-        long_side, short_side = buying_bids, selling_bids
-    else:
-        long_side, short_side = selling_bids, buying_bids
-    
-    traded_quantity = short_side.quantity.sum()
+    step = theta * (bids_uncovered['price'].max() - bids_uncovered['price'].min()) / 2
+    adjusted_price = converged_price(MP, step, FIT, TOU, epsilon)
     
-    for i, x in short_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        trade_qty = min(x.quantity, traded_quantity)
-        trans.add_transaction(i, trade_qty, adjusted_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= trade_qty
-        traded_quantity -= trade_qty
-    
-    quantity_added = 0
-    for i, x in long_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        x_quantity = min(x.quantity, traded_quantity - quantity_added)
-        trans.add_transaction(i, x_quantity, adjusted_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= x_quantity
-        quantity_added += x_quantity
+    match_uncovered_bids(bids_uncovered, trans, lambda short_side, long_side: (adjusted_price, adjusted_price), sides)
     
     return bids_uncovered, adjusted_price
 
@@ -63,52 +49,11 @@ def two_steps_IPA_mechanism(bids: pd.DataFrame, *args, **kwargs):
     theta = kwargs.pop('theta', 0.1)
     epsilon = kwargs.pop('epsilon', 0.01)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: IPA
-    IPAq_ = 0
-    IPAprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
-        bidsM, IPAprice = iterative_price_adjustment(bids_uncovered, trans, theta, epsilon, UPprice, FIT, TOU)
-        IPAq_ = bidsM.quantity.sum()
-    
-    if IPAq_ is None:
-        IPAq_ = 0
-    if IPAprice is None:
-        IPAprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'IPA quantity': IPAq_,
-        'IPA price': IPAprice,
-        'Total quantity': UPq_ + IPAq_
-    }
+    def step2(bids_uncovered, sides, trans, UPprice):
+        bidsM, IPAprice = iterative_price_adjustment(bids_uncovered, trans, theta, epsilon, UPprice, FIT, TOU, sides)
+        return bidsM.quantity.sum(), IPAprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'IPA quantity', 'IPA price')
 
 
 class IPA(pm.Mechanism):
@@ -1,43 +1,17 @@
-import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, match_uncovered_bids
 
-def modified_marginal_price(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager):
+def modified_marginal_price(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, sides=None):
     """
     Modified Marginal Price (MMP) for trading uncovered bids.
     Uses the midpoint between maximum buy price and minimum sell price.
     """
-    buying_bids = bids_uncovered.loc[bids_uncovered['buying']].sort_values('price', ascending=False)
-    selling_bids = bids_uncovered.loc[~bids_uncovered['buying']].sort_values('price', ascending=True)
+    buying = bids_uncovered['buying'].to_numpy(dtype=bool)
+    prices = bids_uncovered['price'].to_numpy(dtype=float)
+    marginal_price = (prices[buying].max() + prices[~buying].min()) / 2
     
-    buying_quantity = buying_bids.quantity.sum()
-    selling_quantity = selling_bids.quantity.sum()
-    
-    if buying_quantity > selling_quantity:
-        long_side, short_side = buying_bids, selling_bids
-    else:
-        long_side, short_side = selling_bids, buying_bids
-    
-    traded_quantity = short_side.quantity.sum()
-    marginal_price = (buying_bids.price.max() + selling_bids.price.min()) / 2
-    
-    for i, x in short_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        trade_qty = min(x.quantity, traded_quantity)
-        trans.add_transaction(i, trade_qty, marginal_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= trade_qty
-        traded_quantity -= trade_qty
-    
-    quantity_added = 0
-    for i, x in long_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        x_quantity = min(x.quantity, traded_quantity - quantity_added)
-        trans.add_transaction(i, x_quantity, marginal_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= x_quantity
-        quantity_added += x_quantity
+    match_uncovered_bids(bids_uncovered, trans, lambda short_side, long_side: (marginal_price, marginal_price), sides)
     
     return bids_uncovered, marginal_price
 
@@ -51,52 +25,11 @@ def two_steps_MMP_mechanism(bids: pd.DataFrame, *args, **kwargs):
     FIT = kwargs.pop('FIT', 0.1)
     TOU = kwargs.pop('TOU', 0.25)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: MMP
-    MMPq_ = 0
-    MMPprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
-        bidsM, MMPprice = modified_marginal_price(bids_uncovered, trans)
-        MMPq_ = bidsM.quantity.sum()
-    
-    if MMPq_ is None:
-        MMPq_ = 0
-    if MMPprice is None:
-        MMPprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'MMP quantity': MMPq_,
-        'MMP price': MMPprice,
-        'Total quantity': UPq_ + MMPq_
-    }
+    def step2(bids_uncovered, sides, trans, UPprice):
+        bidsM, MMPprice = modified_marginal_price(bids_uncovered, trans, sides)
+        return bidsM.quantity.sum(), MMPprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'MMP quantity', 'MMP price')
 
 
 class MMP(pm.Mechanism):
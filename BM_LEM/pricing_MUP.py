@@ -1,15 +1,53 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, sort_sides, add_transactions
 
-def mediation_mechanism(bids: pd.DataFrame, trans: pm.TransactionManager):
+def mediate(short_prices: np.ndarray, short_quantities: np.ndarray, long_prices: np.ndarray, long_quantities: np.ndarray):
+    """
+    Mediation kernel on sorted bid arrays. Each short side bid trades with the
+    remaining long side bids in order, at the midpoint of both prices, until it
+    is filled; a long side bid is used up before moving to the next one.
+    Returns the short and long positions, quantity and price of every trade.
+    """
+    long_left = np.array(long_quantities, dtype=float)
+    # Every trade fills either a short or a long bid
+    max_trades = len(short_prices) + len(long_prices)
+    out_short = np.empty(max_trades, dtype=int)
+    out_long = np.empty(max_trades, dtype=int)
+    out_quantity = np.empty(max_trades)
+    out_price = np.empty(max_trades)
+
+    n = 0
+    j = 0  # first long side bid with quantity left
+    for i in range(len(short_prices)):
+        squantity = short_quantities[i]
+        while j < len(long_prices):
+            lquantity = long_left[j]
+            out_short[n], out_long[n] = i, j
+            out_price[n] = round((short_prices[i] + long_prices[j]) / 2, 4)
+            if squantity < lquantity:
+                out_quantity[n] = squantity
+                long_left[j] = lquantity - squantity
+                squantity = 0
+            else:
+                out_quantity[n] = lquantity
+                squantity = squantity - lquantity
+                j += 1  # long side bid j is used up
+            n += 1
+            if squantity == 0:
+                break
+
+    return out_short[:n], out_long[:n], out_quantity[:n], out_price[:n]
+
+
+def mediation_mechanism(bids: pd.DataFrame, trans: pm.TransactionManager, sides=None):
     """
     P2P mediation mechanism for matching remaining bids after UP mechanism.
+    `sides` are the presorted (buying, selling) bids from `sort_sides`.
     """
-    # get uncovered bids: buy and sell    
-    buying_bids = bids.loc[bids['buying']].sort_values('price', ascending=False)
-    selling_bids = bids.loc[~bids['buying']].sort_values('price', ascending=True)
+    # get uncovered bids: buy and sell
+    buying_bids, selling_bids = sides if sides is not None else sort_sides(bids)
 
     # Find the long side of the market
     buying_quantity = buying_bids.quantity.sum()
@@ -22,37 +60,18 @@ def mediation_mechanism(bids: pd.DataFrame, trans: pm.TransactionManager):
         long_side = selling_bids
         short_side = buying_bids
     
-    q_ = 0
-    # Iterate through short side and mediate with long side 
-    for i, x in short_side.iterrows():
-        sprice = x.price
-        squantity = x.quantity
-        for j, y in long_side.iterrows():
-            lprice = y.price
-            lquantity = y.quantity
-            price = round((sprice + lprice) / 2, 4)
-            if squantity < lquantity:
-                quantity = squantity
-                squantity = 0                 
-                lquantity = lquantity - quantity
-                long_side.loc[long_side.index == j, 'quantity'] = lquantity
-            else:
-                quantity = lquantity
-                lquantity = 0
-                long_side = long_side.drop(j)  # remove bid j
-                squantity = squantity - quantity
-                short_side.loc[short_side.index == j, 'quantity'] = squantity
-            # add transaction and update bids
-            t = (i, quantity, price, -1, False)
-            trans.add_transaction(*t)
-            t = (j, quantity, price, -1, False)
-            trans.add_transaction(*t)
-            q_ = q_ + quantity
-            bids.loc[bids.index == i, 'quantity'] = bids.loc[bids.index == i, 'quantity'] - quantity
-            bids.loc[bids.index == j, 'quantity'] = bids.loc[bids.index == j, 'quantity'] - quantity
-            if squantity == 0: 
-                short_side = short_side.drop(i)  # remove bid i
-                break
+    # Mediate short side bids with the long side
+    short_pos, long_pos, quantities, prices = mediate(
+        short_side['price'].to_numpy(dtype=float), short_side['quantity'].to_numpy(dtype=float),
+        long_side['price'].to_numpy(dtype=float), long_side['quantity'].to_numpy(dtype=float))
+    
+    # add transactions (short side bid, then long side bid, per trade) and update bids
+    trade_bids = np.column_stack((short_side.index[short_pos], long_side.index[long_pos])).ravel().tolist()
+    add_transactions(trans, trade_bids, np.repeat(quantities, 2), np.repeat(prices, 2))
+    bids.loc[short_side.index, 'quantity'] -= np.bincount(short_pos, weights=quantities, minlength=len(short_side))
+    bids.loc[long_side.index, 'quantity'] -= np.bincount(long_pos, weights=quantities, minlength=len(long_side))
+    q_ = quantities.sum()
+    price = prices[-1] if len(prices) else None
     
     return bids, buying_bids, selling_bids, buying_quantity, selling_quantity, price, q_
 
@@ -66,51 +85,11 @@ def two_steps_UPM_mechanism(bids: pd.DataFrame, *args, **kwargs):
     FIT = kwargs.pop('FIT', 0.1)
     TOU = kwargs.pop('TOU', 0.25)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
+    def step2(bids_uncovered, sides, trans, UPprice):
+        bidsM, buying_bids, selling_bids, buying_quantity, selling_quantity, Mprice, Mq_ = mediation_mechanism(bids_uncovered, trans, sides)
+        return Mq_, Mprice
     
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[bidsUP['buying'] == False, 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'] == True, 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: Mediation mechanism
-    Mq_ = 0
-    Mprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0: 
-        bidsM, buying_bids, selling_bids, buying_quantity, selling_quantity, Mprice, Mq_ = mediation_mechanism(bids_uncovered, trans)
-    
-    if Mq_ is None:
-        Mq_ = 0
-    if Mprice is None:
-        Mprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'mediation quantity': Mq_,
-        'last price': Mprice,
-        'Total quantity': UPq_ + Mq_
-    }
-
-    return trans, extra
+    return run_two_step(bids, step2, 'mediation quantity', 'last price')
 
 
 class MUP(pm.Mechanism):
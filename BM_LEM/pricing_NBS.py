@@ -1,35 +1,34 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, add_transactions, greedy_match
+from BM_LEM.pricing_IPA import converged_price
 
 def nash_bargaining_solution(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, cap: float, floor: float, theta: float, epsilon: float, MP: float):
     """
     Nash Bargaining Solution (NBS) for trading uncovered bids.
     Combines iterative price adjustment with bilateral matching.
+    The adjusted price terms of each update cancel, so every iteration adds the
+    same step theta*(max price - min price)/2 clipped to [floor, cap], and the
+    converged price is computed in closed form.
     """
-    adjusted_price = MP
+    step = theta * (bids_uncovered['price'].max() - bids_uncovered['price'].min()) / 2
+    adjusted_price = converged_price(MP, step, floor, cap, epsilon)
     
-    while True:
-        new_price = adjusted_price + theta * ((bids_uncovered['price'].max() - adjusted_price) + (adjusted_price - bids_uncovered['price'].min())) / 2
-        new_price = max(floor, min(new_price, cap))
-        
-        if abs(new_price - adjusted_price) < epsilon:
-            break
-        
-        adjusted_price = new_price
+    # Bilateral matching of buyers and sellers in bid order at the adjusted price
+    buying = bids_uncovered['buying'].to_numpy(dtype=bool)
+    quantity = bids_uncovered['quantity'].to_numpy(dtype=float)
+    buy_positions = np.flatnonzero(buying)
+    sell_positions = np.flatnonzero(~buying)
     
-    for i, row in bids_uncovered.iterrows():
-        if row['buying']:
-            matching_sellers = bids_uncovered.loc[~bids_uncovered['buying']]
-            for j, seller in matching_sellers.iterrows():
-                quantity = min(row['quantity'], seller['quantity'])
-                trans.add_transaction(i, quantity, adjusted_price, -1, False)
-                trans.add_transaction(j, quantity, adjusted_price, -1, False)
-                bids_uncovered.at[i, 'quantity'] -= quantity
-                bids_uncovered.at[j, 'quantity'] -= quantity
-                if bids_uncovered.at[i, 'quantity'] == 0:
-                    break
+    buy_trades, sell_trades, quantities = greedy_match(quantity[buy_positions], quantity[sell_positions])
+    buy_trades, sell_trades = buy_positions[buy_trades], sell_positions[sell_trades]
+    
+    # Buyer then seller transaction per trade
+    trade_bids = np.column_stack((bids_uncovered.index[buy_trades], bids_uncovered.index[sell_trades])).ravel().tolist()
+    add_transactions(trans, trade_bids, np.repeat(quantities, 2), np.full(len(trade_bids), adjusted_price))
+    traded = np.bincount(np.concatenate((buy_trades, sell_trades)), weights=np.tile(quantities, 2), minlength=len(quantity))
+    bids_uncovered['quantity'] = quantity - traded
     
     return bids_uncovered, adjusted_price
 
@@ -47,52 +46,11 @@ def two_steps_NBS_mechanism(bids: pd.DataFrame, *args, **kwargs):
     theta = kwargs.pop('theta', 0.1)
     epsilon = kwargs.pop('epsilon', 0.01)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: NBS
-    NBSq_ = 0
-    NBSprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
+    def step2(bids_uncovered, sides, trans, UPprice):
         bidsM, NBSprice = nash_bargaining_solution(bids_uncovered, trans, cap, floor, theta, epsilon, UPprice)
-        NBSq_ = bidsM.quantity.sum()
-    
-    if NBSq_ is None:
-        NBSq_ = 0
-    if NBSprice is None:
-        NBSprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'NBS quantity': NBSq_,
-        'NBS price': NBSprice,
-        'Total quantity': UPq_ + NBSq_
-    }
+        return bidsM.quantity.sum(), NBSprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'NBS quantity', 'NBS price')
 
 
 class NBS(pm.Mechanism):
@@ -13,27 +13,32 @@ def uniform_price_clearing(bids, *args, **kwargs):
     if len(tradable_bids) == 0:
         return pm.TransactionManager(), {}
 
-    # Step 3: Allocate transactions to short side (fully)
-    for bid in tradable_bids:
-        trans = pm.TransactionManager()
-        trans.add_transaction(bid.id, -1, bid.q, bid.p)
-
-    # Step 4: Allocate transactions to long side (partially)
-    q_traded = min(tradable_bids[0].q, tradable_bids[-1].q)
-    q_accum = 0
-    for i in range(len(tradable_bids)):
-        bid = tradable_bids[i]
-        if q_accum + bid.q <= q_traded:
-            q_x = bid.q
-        else:
-            q_x = q_traded - q_accum
-            break
-        trans = pm.TransactionManager()
-        trans.add_transaction(bid.id, 1, q_x, bid.p)
-        q_accum += q_x
-
-    # Step 5: Return results
-    return trans, {'clearing quantity': q_traded, 'clearing price': bid.p}
+    ids = np.array([bid.id for bid in tradable_bids])
+    q = np.array([bid.q for bid in tradable_bids], dtype=float)
+    p = np.array([bid.p for bid in tradable_bids], dtype=float)
+    buying = np.array([bid.buying for bid in tradable_bids], dtype=bool)
+
+    # Steps 3-5: Allocate both sides and record each bid once
+    return record_tradable_bids(ids, q, p, buying)
+
+def record_tradable_bids(ids, q, p, buying):
+    # Both sides trade the smaller side total: the short side is filled
+    # completely, the long side in bid order until that quantity is reached
+    q_traded = min(q[buying].sum(), q[~buying].sum())
+    alloc = np.empty_like(q)
+    for side in (buying, ~buying):
+        q_side = q[side]
+        alloc[side] = np.minimum(q_side, np.maximum(0, q_traded - (np.cumsum(q_side) - q_side)))
+
+    # One transaction per allocated bid
+    trans = pm.TransactionManager()
+    for i in np.flatnonzero(alloc > 0):
+        trans.add_transaction(ids[i], alloc[i], p[i], -1, False)
+
+    # The clearing price is set by the marginal bid of the long side
+    long_side = buying if q[buying].sum() >= q[~buying].sum() else ~buying
+    marginal = min(np.searchsorted(np.cumsum(alloc[long_side]), q_traded), long_side.sum() - 1)
+    return trans, {'clearing quantity': q_traded, 'clearing price': p[long_side][marginal]}
 
 class UniformPrice(pm.Mechanism):
     def __init__(self, bids, *args, **kwargs):
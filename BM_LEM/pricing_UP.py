@@ -1,45 +1,261 @@
-import pandas as pd
-import pymarket as pm
+from collections import OrderedDict
+import threading
+import warnings
 
+import numpy as np
 import pandas as pd
 import pymarket as pm
 
+
+BID_DTYPES = {'quantity': 'float64', 'price': 'float64', 'buying': 'bool'}
+
+
+def coerce_bid_dtypes(bids: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make sure the quantity, price and buying columns are plain float64/bool
+    NumPy columns, so the `to_numpy` calls of the mechanisms are zero-copy.
+    Bids that already have these dtypes are returned as they are.
+    """
+    wrong = {column: dtype for column, dtype in BID_DTYPES.items() if bids[column].dtype != dtype}
+    if not wrong:
+        return bids
+    warnings.warn(f"Converting bid columns {sorted(wrong)} to {BID_DTYPES}", stacklevel=3)
+    return bids.astype(wrong)
+
+
+def clearing_price_and_quantity(buy_prices: np.ndarray, buy_quantities: np.ndarray,
+                                sell_prices: np.ndarray, sell_quantities: np.ndarray):
+    """
+    Clearing search on plain arrays. Buy bids must be sorted by descending
+    price and sell bids by ascending price.
+    """
+    # Demand accumulates from the highest bid down, supply from the lowest ask up
+    cum_demand = np.concatenate(([0.0], np.cumsum(buy_quantities)))
+    cum_supply = np.concatenate(([0.0], np.cumsum(sell_quantities)))
+
+    # Candidate clearing prices = unique sorted prices from both sides
+    candidate_prices = np.unique(np.concatenate((buy_prices, sell_prices)))
+
+    # Demand: total quantity where bid price ≥ p
+    demand_qty = cum_demand[len(buy_prices) - np.searchsorted(buy_prices[::-1], candidate_prices, side='left')]
+    # Supply: total quantity where ask price ≤ p
+    supply_qty = cum_supply[np.searchsorted(sell_prices, candidate_prices, side='right')]
+    # Traded quantity = min of both
+    traded_qty = np.minimum(demand_qty, supply_qty)
+
+    # First (lowest) price reaching the maximum traded quantity
+    best = int(np.argmax(traded_qty))
+    if traded_qty[best] <= 0:
+        return None, None
+
+    return float(traded_qty[best]), float(candidate_prices[best])
+
+
 def find_clearing_price_and_quantity(bids: pd.DataFrame):
     """
     Determine the uniform clearing price and quantity based on aggregated
     supply and demand where cumulative demand >= cumulative supply.
     """
+    bids = coerce_bid_dtypes(bids)
+
     # Separate buy/sell
-    buyers = bids[bids['buying']].copy()
-    sellers = bids[~bids['buying']].copy()
+    buying = bids['buying'].to_numpy(dtype=bool)
+    prices = bids['price'].to_numpy(dtype=float)
+    quantities = bids['quantity'].to_numpy(dtype=float)
 
-    if buyers.empty or sellers.empty:
+    if buying.all() or not buying.any():
         return None, None
 
-    # Candidate clearing prices = unique sorted prices from both sides
-    candidate_prices = sorted(set(buyers['price']).union(sellers['price']))
+    # Sort each side once, as positions into the full columns
+    buy_positions = np.flatnonzero(buying)
+    sell_positions = np.flatnonzero(~buying)
+    buy_order = buy_positions[np.argsort(-prices[buy_positions], kind='stable')]
+    sell_order = sell_positions[np.argsort(prices[sell_positions], kind='stable')]
+
+    return clearing_price_and_quantity(
+        prices[buy_order], quantities[buy_order],
+        prices[sell_order], quantities[sell_order]
+    )
+
+def sort_sides(bids: pd.DataFrame):
+    """
+    Split bids into buying bids by descending price and selling bids by
+    ascending price, ties kept in bid order.
+    """
+    buying = bids['buying'].to_numpy(dtype=bool)
+    prices = bids['price'].to_numpy(dtype=float)
+    buy_positions = np.flatnonzero(buying)
+    sell_positions = np.flatnonzero(~buying)
+    buy_order = buy_positions[np.argsort(-prices[buy_positions], kind='stable')]
+    sell_order = sell_positions[np.argsort(prices[sell_positions], kind='stable')]
+    return bids.iloc[buy_order], bids.iloc[sell_order]
 
-    best_price = None
-    best_quantity = 0
+def signed_prices(bids: pd.DataFrame) -> np.ndarray:
+    """
+    Welfare contribution of each bid: its price if buying, minus its price if
+    selling. Sellers are negated in place on a single copy of the prices.
+    """
+    values = bids['price'].to_numpy(dtype=float, copy=True)
+    np.negative(values, out=values, where=~bids['buying'].to_numpy(dtype=bool))
+    return values
 
-    for p in candidate_prices:
-        # Demand: total quantity where bid price ≥ p
-        demand_qty = buyers.loc[buyers['price'] >= p, 'quantity'].sum()
-        # Supply: total quantity where ask price ≤ p
-        supply_qty = sellers.loc[sellers['price'] <= p, 'quantity'].sum()
-        # Traded quantity = min of both
-        traded_qty = min(demand_qty, supply_qty)
+def allocate_in_order(quantities: np.ndarray, traded_quantity: float) -> np.ndarray:
+    """
+    Allocate `traded_quantity` over bids in the given order, filling each bid
+    completely before moving to the next one.
+    """
+    # Quantity left before each bid, subtracted one bid at a time as a sequential
+    # fill would, so a bid that exactly uses up the rest leaves no rounding residue
+    left_before = np.subtract.accumulate(np.concatenate(([traded_quantity], quantities)))[:-1]
+    return np.minimum(quantities, np.maximum(0.0, left_before))
 
-        if traded_qty > best_quantity:
-            best_quantity = traded_qty
-            best_price = p
 
-    if best_quantity == 0:
-        return None, None
+def merge_up_transactions(trans: pm.TransactionManager, trans_UP: pm.TransactionManager, bids: pd.DataFrame):
+    """
+    Copy the UP transactions into `trans` and return the quantity left on
+    each bid of `bids` after the UP step, as an array in bid order. `bids`
+    itself is not modified.
+    """
+    trans.trans.extend(trans_UP.trans)
+    trans.n_trans += trans_UP.n_trans
+
+    quantity = bids['quantity'].to_numpy(dtype=float, copy=True)
+    if trans_UP.n_trans > 0:
+        # Single scan of the transaction tuples, without building the transaction DataFrame
+        traded_bids, traded_quantities = zip(*((t[0], t[1]) for t in trans_UP.trans))
+        positions = bids.index.get_indexer(list(traded_bids))
+        known = positions >= 0
+        np.subtract.at(quantity, positions[known], np.asarray(traded_quantities, dtype=float)[known])
+    return quantity
+
+
+def uncovered_bids(bids: pd.DataFrame, quantity: np.ndarray) -> pd.DataFrame:
+    """
+    Bids with quantity left, as a new frame carrying their remaining quantity.
+    """
+    alive = quantity > 0
+    return bids.iloc[alive].assign(quantity=quantity[alive])
+
+
+def greedy_match(buy_quantities: np.ndarray, sell_quantities: np.ndarray):
+    """
+    Two-pointer greedy matching of buying and selling bids in the given order:
+    each trade is the smaller of both remaining quantities and a bid is left
+    once it is filled. Returns the buy and sell positions and the quantity of
+    every trade.
+    """
+    buy_left = np.array(buy_quantities, dtype=float)
+    sell_left = np.array(sell_quantities, dtype=float)
+    # Every trade fills a buying or a selling bid
+    max_trades = len(buy_left) + len(sell_left)
+    out_buy = np.empty(max_trades, dtype=int)
+    out_sell = np.empty(max_trades, dtype=int)
+    out_quantity = np.empty(max_trades)
+
+    n = i = j = 0
+    while i < len(buy_left) and j < len(sell_left):
+        quantity = min(buy_left[i], sell_left[j])
+        out_buy[n], out_sell[n], out_quantity[n] = i, j, quantity
+        n += 1
+        buy_left[i] -= quantity
+        sell_left[j] -= quantity
+        if buy_left[i] == 0:
+            i += 1
+        if sell_left[j] == 0:
+            j += 1
+
+    return out_buy[:n], out_sell[:n], out_quantity[:n]
+
+
+def add_transactions(trans: pm.TransactionManager, bids, quantities, prices):
+    """
+    Record one transaction per (bid, quantity, price) with a single extend of
+    the transaction list instead of one add_transaction call per trade.
+    """
+    new_trans = [(bid, quantity, price, -1, False) for bid, quantity, price in zip(bids, quantities, prices)]
+    trans.trans.extend(new_trans)
+    trans.n_trans += len(new_trans)
+
+
+def run_two_step(bids: pd.DataFrame, step2, quantity_key: str, price_key: str):
+    """
+    Shared driver of the two-step mechanisms.
+    Step 1: Run UP mechanism
+    Step 2: If quantity is left on both sides, run `step2(bids_uncovered, sides, trans, UPprice)`
+    on the uncovered bids, `sides` being their (buying, selling) bids sorted once
+    by `sort_sides`; it returns the (quantity, price) reported under
+    `quantity_key` and `price_key`.
+    """
+    bids = coerce_bid_dtypes(bids)
+    trans = pm.TransactionManager()
+
+    # Step 1: UP mechanism
+    trans_UP, result_UP = cached_uniform_price_mechanism(bids)
+    UPprice = result_UP['clearing price']
+    UPq_ = result_UP['clearing quantity']
+
+    # Merge UP transactions and get the remaining quantities
+    quantity = merge_up_transactions(trans, trans_UP, bids)
+
+    # Step 2, skipped when Step 1 cleared the market or a single bid is left
+    step2_q = 0
+    step2_price = UPprice
+    if np.count_nonzero(quantity > 0) > 1:
+        # One pass over the quantity array and buying mask for all three selections
+        buying = bids['buying'].to_numpy(dtype=bool)
+        unsold_quantity = quantity[~buying].sum()
+        demanded_quantity = quantity[buying].sum()
+        if unsold_quantity > 0 and demanded_quantity > 0:
+            bids_uncovered = uncovered_bids(bids, quantity)
+            step2_q, step2_price = step2(bids_uncovered, sort_sides(bids_uncovered), trans, UPprice)
+
+    if step2_q is None:
+        step2_q = 0
+    if step2_price is None:
+        step2_price = UPprice
+    if UPq_ is None:
+        UPq_ = 0
+
+    extra = {
+        'clearing quantity UP': UPq_,
+        'clearing price': UPprice,
+        quantity_key: step2_q,
+        price_key: step2_price,
+        'Total quantity': UPq_ + step2_q
+    }
+
+    return trans, extra
+
+
+def match_uncovered_bids(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, price_rule, sides=None):
+    """
+    Second step shared by the two-step mechanisms: buyers (by descending price)
+    and sellers (by ascending price) trade in order, the side with the smaller
+    total quantity trading fully. `price_rule(short_side, long_side)` returns
+    the trade prices of the short and long side bids. Remaining quantities are
+    updated in `bids_uncovered`. `sides` are the presorted (buying, selling)
+    bids from `sort_sides`, computed here if not given.
+    """
+    buying_bids, selling_bids = sides if sides is not None else sort_sides(bids_uncovered)
+
+    if buying_bids.quantity.sum() > selling_bids.quantity.sum():
+        long_side, short_side = buying_bids, selling_bids
+    else:
+        long_side, short_side = selling_bids, buying_bids
+
+    # The short side trades fully, the long side fills up to the same quantity
+    traded_quantity = short_side.quantity.sum()
+    short_prices, long_prices = price_rule(short_side, long_side)
+    for side, prices in ((short_side, short_prices), (long_side, long_prices)):
+        alloc = allocate_in_order(side['quantity'].to_numpy(), traded_quantity)
+        # Bids trade up to the first one left without an allocation
+        n_traded = np.logical_and.accumulate(alloc > 0).sum()
+        add_transactions(trans, side.index[:n_traded], alloc[:n_traded], np.broadcast_to(prices, alloc.shape)[:n_traded])
+        bids_uncovered.loc[side.index, 'quantity'] -= alloc
 
-    return best_quantity, best_price
 
 def uniform_price_mechanism(bids: pd.DataFrame):
+    bids = coerce_bid_dtypes(bids)
     trans = pm.TransactionManager()
 
     clearing_quantity, clearing_price = find_clearing_price_and_quantity(bids)
@@ -50,38 +266,27 @@ def uniform_price_mechanism(bids: pd.DataFrame):
     else:
         print(f"Clearing price: {clearing_price}, Clearing quantity: {clearing_quantity}")
 
+    buying = bids['buying'].to_numpy(dtype=bool)
+    prices = bids['price'].to_numpy(dtype=float)
+    quantities = bids['quantity'].to_numpy(dtype=float)
+
     # Filter bids willing to trade at clearing price
-    buyers = bids[(bids['buying']) & (bids['price'] >= clearing_price)].copy()
-    sellers = bids[(~bids['buying']) & (bids['price'] <= clearing_price)].copy()
+    buyers = np.flatnonzero(buying & (prices >= clearing_price))
+    sellers = np.flatnonzero(~buying & (prices <= clearing_price))
 
     # Sort for matching
-    buyers.sort_values(by='price', ascending=False, inplace=True)
-    sellers.sort_values(by='price', ascending=True, inplace=True)
+    buyers = buyers[np.argsort(-prices[buyers], kind='stable')]
+    sellers = sellers[np.argsort(prices[sellers], kind='stable')]
 
     # Traded quantity = min of demand/supply sides
-    traded_quantity = min(buyers['quantity'].sum(), sellers['quantity'].sum())
-
-    # Execute seller trades (short side)
-    qty_left = traded_quantity
-    for i, row in sellers.iterrows():
-        q = min(row['quantity'], qty_left)
-        if q <= 0:
-            continue
-        trans.add_transaction(i, q, clearing_price, -1, False)
-        qty_left -= q
-        if qty_left <= 0:
-            break
-
-    # Execute buyer trades
-    qty_left = traded_quantity
-    for i, row in buyers.iterrows():
-        q = min(row['quantity'], qty_left)
-        if q <= 0:
-            continue
-        trans.add_transaction(i, q, clearing_price, -1, False)
-        qty_left -= q
-        if qty_left <= 0:
-            break
+    traded_quantity = min(quantities[buyers].sum(), quantities[sellers].sum())
+
+    # Execute seller trades, then buyer trades: each side fills in price order up
+    # to the traded quantity, bids without positive quantity are skipped
+    for side in (sellers, buyers):
+        alloc = allocate_in_order(np.maximum(quantities[side], 0.0), traded_quantity)
+        traded = alloc > 0
+        add_transactions(trans, bids.index[side[traded]], alloc[traded], np.full(traded.sum(), clearing_price))
 
     return trans, {
         'clearing quantity': round(traded_quantity, 4),
@@ -89,6 +294,43 @@ def uniform_price_mechanism(bids: pd.DataFrame):
     }
 
 
+# UP results of recently cleared bid books, most recently used last
+_UP_CACHE = OrderedDict()
+_UP_CACHE_SIZE = 128
+# Two-step mechanisms run from worker threads, so every cache access holds the lock
+_UP_CACHE_LOCK = threading.Lock()
+
+
+def cached_uniform_price_mechanism(bids: pd.DataFrame):
+    """
+    `uniform_price_mechanism` memoized on the bid contents, so two-step
+    mechanisms run on the same bids only clear the UP step once. Every call
+    returns its own TransactionManager.
+    """
+    key = pd.util.hash_pandas_object(bids[['quantity', 'price', 'buying']], index=True).to_numpy().tobytes()
+    with _UP_CACHE_LOCK:
+        cached = _UP_CACHE.get(key)
+        if cached is not None:
+            _UP_CACHE.move_to_end(key)
+
+    if cached is not None:
+        transactions, result = cached
+    else:
+        # Cleared outside the lock, so threads only wait for cache bookkeeping
+        trans, result = uniform_price_mechanism(bids)
+        transactions = list(trans.trans)
+        with _UP_CACHE_LOCK:
+            _UP_CACHE[key] = (transactions, result)
+            _UP_CACHE.move_to_end(key)
+            if len(_UP_CACHE) > _UP_CACHE_SIZE:
+                _UP_CACHE.popitem(last=False)
+
+    trans = pm.TransactionManager()
+    trans.trans.extend(transactions)
+    trans.n_trans += len(transactions)
+    return trans, dict(result)
+
+
 
 class UP(pm.Mechanism):
     """
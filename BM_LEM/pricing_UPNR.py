@@ -1,15 +1,14 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, allocate_in_order, add_transactions, sort_sides
 
-def newton_raphson_adjustment(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, FIT: float, TOU: float):
+def newton_raphson_adjustment(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, FIT: float, TOU: float, sides=None):
     """
     Newton-Raphson adjustment mechanism for price discovery on uncovered bids.
     """
     # get uncovered bids: buy and sell    
-    buyers = bids_uncovered.loc[bids_uncovered['buying']].sort_values('price', ascending=False)
-    sellers = bids_uncovered.loc[~bids_uncovered['buying']].sort_values('price', ascending=True)
+    buyers, sellers = sides if sides is not None else sort_sides(bids_uncovered)
     
     # Find the long side of the market
     QS = sellers['quantity'].sum()
@@ -17,48 +16,65 @@ def newton_raphson_adjustment(bids_uncovered: pd.DataFrame, trans: pm.Transactio
     maxQt = min(QS, QB)
     k = 0.0005
     
+    # The solver works on plain arrays: prices and quantities of each side and
+    # the side mean prices are extracted once instead of on every evaluation
+    buy_prices = buyers['price'].to_numpy(dtype=float)
+    buy_quantities = buyers['quantity'].to_numpy(dtype=float)
+    sell_prices = sellers['price'].to_numpy(dtype=float)
+    sell_quantities = sellers['quantity'].to_numpy(dtype=float)
+    buy_mean = buy_prices.mean()
+    sell_mean = sell_prices.mean()
+    
+    def mid_price(k):
+        return (sell_mean * (1 - k) + buy_mean * (1 + k)) / 2
+    
     # Define the function and Newton-Raphson implementation
-    def fprice(k, buyers, sellers, maxQt):
-        price = (sellers['price'].mean() * (1 - k) + buyers['price'].mean() * (1 + k)) / 2
-        demand = buyers.loc[buyers['price'] * (1 + k) > price, 'quantity'].sum()
-        supply = sellers.loc[sellers['price'] * (1 - k) < price, 'quantity'].sum()
+    def fprice(k):
+        price = mid_price(k)
+        demand = buy_quantities[buy_prices * (1 + k) > price].sum()
+        supply = sell_quantities[sell_prices * (1 - k) < price].sum()
         Qt = min(demand, supply)
-        if demand > maxQt:
-            demand = maxQt
-        if supply > maxQt:
-            supply = maxQt
-        fprice = maxQt - Qt
-        return fprice
+        return maxQt - Qt
     
-    def numerical_derivative(f, buyers, sellers, maxQt, initial_h=1e-5, max_iterations=100):
-        h = initial_h
-        for i in range(max_iterations):
-            derivative = (f(k + h, buyers, sellers, maxQt) - f(k, buyers, sellers, maxQt)) / h
-            if derivative != 0:
-                return derivative  # Return the derivative if it's non-zero
-            # Adjust h if derivative is zero
-            h *= 10  # Increase h by a factor of 10       
-        # If all adjustments result in a zero derivative, return zero
-        return 0
+    def numerical_derivative(k, h=1e-4):
+        # Central difference; fprice is piecewise constant in k, so this is 0 on a plateau
+        return (fprice(k + h) - fprice(k - h)) / (2 * h)
+    
+    def next_plateau(k, f_p, h=1e-4, max_doublings=60):
+        # Nearest k + h * 2**n where fprice drops below f_p, None if there is none
+        step = h
+        for i in range(max_doublings):
+            if fprice(k + step) < f_p:
+                return k + step
+            step *= 2
+        return None
     
     # Refined Newton-Raphson implementation 
-    def find_equilibrium_newton_raphson(k, buyers, sellers, tolerance=0.01, max_iterations=100, epsilon=1e-5):
+    def find_equilibrium_newton_raphson(k, tolerance=0.01, max_iterations=100, epsilon=1e-5):
+        price = round(mid_price(k), 4)
         for i in range(max_iterations):
-            f_p = fprice(k, buyers, sellers, maxQt)
-            f_prime_p = numerical_derivative(fprice, buyers, sellers, maxQt)
+            f_p = fprice(k)
             
             if abs(f_p) < tolerance:
-                price = round((sellers['price'].mean() * (1 - k) + buyers['price'].mean() * (1 + k)) / 2, 4)
+                price = round(mid_price(k), 4)
                 print(f"Converged in {i} iterations: Price = {price}, k={k}")
                 return price  # Convergence achieved
-   
-            # Newton-Raphson update
-            k = k - 0.1 * f_p / (f_prime_p + epsilon)  
-            price = round((sellers['price'].mean() * (1 - k) + buyers['price'].mean() * (1 + k)) / 2, 4)
+            
+            f_prime_p = numerical_derivative(k)
+            if f_prime_p != 0:
+                # Newton-Raphson update
+                k = k - 0.1 * f_p / (f_prime_p + epsilon)
+            else:
+                # Flat plateau: step to the next lower plateau instead of widening h
+                k_next = next_plateau(k, f_p)
+                if k_next is None:
+                    break
+                k = k_next
+            price = round(mid_price(k), 4)
         return price  # Return the best guess after max iterations
     
     # Apply the refined Newton-Raphson method to find the equilibrium price
-    price = find_equilibrium_newton_raphson(k, buyers, sellers)
+    price = find_equilibrium_newton_raphson(k)
     
     # Check if price exceeds TOU or FIT and return 0
     if price > TOU or price < FIT:
@@ -74,24 +90,16 @@ def newton_raphson_adjustment(bids_uncovered: pd.DataFrame, trans: pm.Transactio
     traded_quantity = maxQt
     
     # All the short side will trade at `price`
-    for i, x in short_side.iterrows():
-        t = (i, x.quantity, price, -1, False)
-        trans.add_transaction(*t)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] = bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] - x.quantity
-
+    short_alloc = short_side['quantity'].to_numpy(dtype=float)
     # The long side has to trade only up to the short side
-    quantity_added = 0
-    for i, x in long_side.iterrows():
-        if quantity_added == traded_quantity:
-            break
-        if x.quantity + quantity_added <= traded_quantity:
-            x_quantity = x.quantity
-        else:
-            x_quantity = traded_quantity - quantity_added
-        t = (i, x_quantity, price, -1, False)
-        trans.add_transaction(*t)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] = bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] - x_quantity
-        quantity_added += x_quantity
+    long_alloc = allocate_in_order(long_side['quantity'].to_numpy(dtype=float), traded_quantity)
+    long_traded = long_alloc > 0
+    
+    # Trades of both sides are recorded in one batch each
+    add_transactions(trans, short_side.index, short_alloc, np.full(len(short_alloc), price))
+    add_transactions(trans, long_side.index[long_traded], long_alloc[long_traded], np.full(long_traded.sum(), price))
+    bids_uncovered.loc[short_side.index, 'quantity'] -= short_alloc
+    bids_uncovered.loc[long_side.index, 'quantity'] -= long_alloc
 
     return bids_uncovered, buyers, sellers, QB, QS, price, traded_quantity
 
@@ -105,51 +113,11 @@ def two_steps_UPNR_mechanism(bids: pd.DataFrame, *args, **kwargs):
     FIT = kwargs.pop('FIT', 0.1)
     TOU = kwargs.pop('TOU', 0.25)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
+    def step2(bids_uncovered, sides, trans, UPprice):
+        bidsM, buying_bids, selling_bids, buying_quantity, selling_quantity, Mprice, Mq_ = newton_raphson_adjustment(bids_uncovered, trans, FIT, TOU, sides)
+        return Mq_, Mprice
     
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[bidsUP['buying'] == False, 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'] == True, 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: Newton-Raphson adjustment mechanism
-    Mq_ = 0
-    Mprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
-        bidsM, buying_bids, selling_bids, buying_quantity, selling_quantity, Mprice, Mq_ = newton_raphson_adjustment(bids_uncovered, trans, FIT, TOU)
-    
-    if Mq_ is None:
-        Mq_ = 0
-    if Mprice is None:
-        Mprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'mediation quantity': Mq_,
-        'last price': Mprice,
-        'Total quantity': UPq_ + Mq_
-    }
-
-    return trans, extra
+    return run_two_step(bids, step2, 'mediation quantity', 'last price')
 
 
 class UPNR(pm.Mechanism):
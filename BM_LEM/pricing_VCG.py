@@ -1,41 +1,44 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, add_transactions, greedy_match
 
 def vickrey_clarke_groves(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, cap: float, floor: float, MP: float):
     """
     Vickrey-Clarke-Groves (VCG) mechanism for trading uncovered bids.
     Uses welfare-based pricing with individual prices for buyers and sellers.
     """
-    def calculate_welfare(bids):
-        return (bids.loc[bids['buying'], 'price'] - bids.loc[~bids['buying'], 'price']).sum()
+    buying = bids_uncovered['buying'].to_numpy(dtype=bool)
+    prices = bids_uncovered['price'].to_numpy(dtype=float)
+    quantity = bids_uncovered['quantity'].to_numpy(dtype=float)
     
-    total_welfare = calculate_welfare(bids_uncovered)
+    # The welfare (sum of buying prices - sum of selling prices) is additive, so
+    # leaving one bid out only removes its own price from its side's sum
+    buy_sum = prices[buying].sum()
+    sell_sum = prices[~buying].sum()
+    total_welfare = buy_sum - sell_sum
     VCG_price = MP
     
-    for i, row in bids_uncovered.iterrows():
-        if row['buying']:
-            welfare_without_i = calculate_welfare(bids_uncovered.drop(i))
-            MC = row['price']
-            P_Bi = MP - (welfare_without_i - total_welfare - MC)
-            P_Bi = max(floor, min(P_Bi, cap))
-            
-            matching_sellers = bids_uncovered.loc[~bids_uncovered['buying']]
-            for j, seller in matching_sellers.iterrows():
-                welfare_without_j = calculate_welfare(bids_uncovered.drop(j))
-                MU = seller['price']
-                P_Sj = MP - (welfare_without_j - total_welfare - MU)
-                P_Sj = max(floor, min(P_Sj, cap))
-                
-                quantity = min(row['quantity'], seller['quantity'])
-                trans.add_transaction(i, quantity, P_Bi, -1, False)
-                trans.add_transaction(j, quantity, P_Sj, -1, False)
-                bids_uncovered.at[i, 'quantity'] -= quantity
-                bids_uncovered.at[j, 'quantity'] -= quantity
-                VCG_price = (P_Bi + P_Sj) / 2
-                if bids_uncovered.at[i, 'quantity'] == 0:
-                    break
+    # Individual prices of all buyers and sellers, MP - (W(without bid) - W - own price)
+    # limited to [floor, cap]; neither depends on the counterpart of a trade
+    buyers = np.flatnonzero(buying)
+    sellers = np.flatnonzero(~buying)
+    welfare_without_buyers = (buy_sum - prices[buyers]) - sell_sum
+    welfare_without_sellers = buy_sum - (sell_sum - prices[sellers])
+    buyer_prices = np.maximum(floor, np.minimum(MP - (welfare_without_buyers - total_welfare - prices[buyers]), cap))
+    seller_prices = np.maximum(floor, np.minimum(MP - (welfare_without_sellers - total_welfare - prices[sellers]), cap))
+    
+    # Greedy matching in bid order, each side paying its own individual price
+    buy_trades, sell_trades, trade_quantities = greedy_match(quantity[buyers], quantity[sellers])
+    if len(trade_quantities):
+        VCG_price = (buyer_prices[buy_trades[-1]] + seller_prices[sell_trades[-1]]) / 2
+    
+    # Buyer then seller transaction per trade
+    trade_bids = np.column_stack((bids_uncovered.index[buyers[buy_trades]], bids_uncovered.index[sellers[sell_trades]])).ravel().tolist()
+    trade_prices = np.column_stack((buyer_prices[buy_trades], seller_prices[sell_trades])).ravel()
+    add_transactions(trans, trade_bids, np.repeat(trade_quantities, 2), trade_prices)
+    traded = np.bincount(np.concatenate((buyers[buy_trades], sellers[sell_trades])), weights=np.tile(trade_quantities, 2), minlength=len(quantity))
+    bids_uncovered['quantity'] = quantity - traded
     
     return bids_uncovered, VCG_price
 
@@ -51,52 +54,11 @@ def two_steps_VCG_mechanism(bids: pd.DataFrame, *args, **kwargs):
     cap = kwargs.pop('cap', 100)
     floor = kwargs.pop('floor', 10)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: VCG
-    VCGq_ = 0
-    VCGprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
+    def step2(bids_uncovered, sides, trans, UPprice):
         bidsM, VCGprice = vickrey_clarke_groves(bids_uncovered, trans, cap, floor, UPprice)
-        VCGq_ = bidsM.quantity.sum()
-    
-    if VCGq_ is None:
-        VCGq_ = 0
-    if VCGprice is None:
-        VCGprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'VCG quantity': VCGq_,
-        'VCG price': VCGprice,
-        'Total quantity': UPq_ + VCGq_
-    }
+        return bidsM.quantity.sum(), VCGprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'VCG quantity', 'VCG price')
 
 
 class VCG(pm.Mechanism):
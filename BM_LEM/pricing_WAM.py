@@ -1,43 +1,21 @@
 import numpy as np
 import pandas as pd
 import pymarket as pm
-from BM_LEM.pricing_UP import find_clearing_price_and_quantity, uniform_price_mechanism
+from BM_LEM.pricing_UP import run_two_step, match_uncovered_bids, sort_sides, coerce_bid_dtypes
 
-def weighted_average_method(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager):
+def weighted_average_method(bids_uncovered: pd.DataFrame, trans: pm.TransactionManager, sides=None):
     """
     Weighted Average Method (WAM) for trading uncovered bids.
     Uses quantity-weighted average prices.
     """
-    buying_bids = bids_uncovered.loc[bids_uncovered['buying']].sort_values('price', ascending=False)
-    selling_bids = bids_uncovered.loc[~bids_uncovered['buying']].sort_values('price', ascending=True)
+    bids_uncovered = coerce_bid_dtypes(bids_uncovered)
+    buying_bids, selling_bids = sides if sides is not None else sort_sides(bids_uncovered)
     
-    buying_quantity = buying_bids.quantity.sum()
-    selling_quantity = selling_bids.quantity.sum()
+    # Quantity-weighted average of all uncovered bid prices
+    quantities = bids_uncovered['quantity'].to_numpy(dtype=float)
+    weighted_price = np.dot(bids_uncovered['price'].to_numpy(dtype=float), quantities) / quantities.sum()
     
-    if buying_quantity > selling_quantity:
-        long_side, short_side = buying_bids, selling_bids
-    else:
-        long_side, short_side = selling_bids, buying_bids
-    
-    traded_quantity = short_side.quantity.sum()
-    weighted_price = (buying_bids.price.multiply(buying_bids.quantity).sum() + selling_bids.price.multiply(selling_bids.quantity).sum()) / (buying_quantity + selling_quantity)
-    
-    for i, x in short_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        trade_qty = min(x.quantity, traded_quantity)
-        trans.add_transaction(i, trade_qty, weighted_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= trade_qty
-        traded_quantity -= trade_qty
-    
-    quantity_added = 0
-    for i, x in long_side.iterrows():
-        if traded_quantity <= 0:
-            break
-        x_quantity = min(x.quantity, traded_quantity - quantity_added)
-        trans.add_transaction(i, x_quantity, weighted_price, -1, False)
-        bids_uncovered.loc[bids_uncovered.index == i, 'quantity'] -= x_quantity
-        quantity_added += x_quantity
+    match_uncovered_bids(bids_uncovered, trans, lambda short_side, long_side: (weighted_price, weighted_price), (buying_bids, selling_bids))
     
     return bids_uncovered, weighted_price
 
@@ -51,52 +29,11 @@ def two_steps_WAM_mechanism(bids: pd.DataFrame, *args, **kwargs):
     FIT = kwargs.pop('FIT', 0.1)
     TOU = kwargs.pop('TOU', 0.25)
     
-    trans = pm.TransactionManager()
-    bidsUP = bids.copy()
-    
-    # Step 1: UP mechanism
-    trans_UP, result_UP = uniform_price_mechanism(bids)
-    UPprice = result_UP['clearing price']
-    UPq_ = result_UP['clearing quantity']
-    
-    # Merge UP transactions
-    for _, row in trans_UP.get_df().iterrows():
-        trans.add_transaction(row['bid'], row['quantity'], row['price'], row['source'], row['active'])
-    
-    # Update remaining quantities
-    for _, row in trans_UP.get_df().iterrows():
-        bid_index = row['bid']
-        quantity = row['quantity']
-        if bid_index in bidsUP.index:
-            bidsUP.loc[bid_index, 'quantity'] -= quantity
-    
-    unsold_quantity = bidsUP.loc[~bidsUP['buying'], 'quantity'].sum()
-    demanded_quantity = bidsUP.loc[bidsUP['buying'], 'quantity'].sum()
-    bids_uncovered = bidsUP.loc[bidsUP['quantity'] > 0, :]
-    
-    # Step 2: WAM
-    WAMq_ = 0
-    WAMprice = UPprice
-    if unsold_quantity > 0 and demanded_quantity > 0:
-        bidsM, WAMprice = weighted_average_method(bids_uncovered, trans)
-        WAMq_ = bidsM.quantity.sum()
-    
-    if WAMq_ is None:
-        WAMq_ = 0
-    if WAMprice is None:
-        WAMprice = UPprice
-    if UPq_ is None:
-        UPq_ = 0
-    
-    extra = {
-        'clearing quantity UP': UPq_,
-        'clearing price': UPprice,
-        'WAM quantity': WAMq_,
-        'WAM price': WAMprice,
-        'Total quantity': UPq_ + WAMq_
-    }
+    def step2(bids_uncovered, sides, trans, UPprice):
+        bidsM, WAMprice = weighted_average_method(bids_uncovered, trans, sides)
+        return bidsM.quantity.sum(), WAMprice
     
-    return trans, extra
+    return run_two_step(bids, step2, 'WAM quantity', 'WAM price')
 
 
 class WAM(pm.Mechanism):
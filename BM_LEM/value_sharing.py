@@ -13,10 +13,19 @@ Available Models:
 6. Cooperative Game (CG)
 """
 
+import os
+import json
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Dict, Tuple, Optional
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:  # optional, results are dumped with json without it
+    orjson = None
+
 from .vs_equal_sharing import equal_sharing_timeseries
 from .vs_generation_based import generation_based_sharing_timeseries
 from .vs_consumption_based import consumption_based_sharing_timeseries
@@ -25,6 +34,11 @@ from .vs_shapley_value import shapley_value_sharing_timeseries
 from .vs_cooperative_game import cooperative_game_sharing_timeseries
 
 
+# Inputs with fewer values than this (members x timestamps) are compared serially,
+# starting the worker processes would cost more than the methods themselves
+PARALLEL_MIN_SIZE = 10_000
+
+
 class ValueSharingMethod(Enum):
     """Enumeration of available value sharing methods."""
     EQUAL = "EQ"
@@ -35,6 +49,24 @@ class ValueSharingMethod(Enum):
     COOPERATIVE_GAME = "CG"
 
 
+# Timeseries function of each method
+_DISPATCH = {
+    ValueSharingMethod.EQUAL: equal_sharing_timeseries,
+    ValueSharingMethod.GENERATION_BASED: generation_based_sharing_timeseries,
+    ValueSharingMethod.CONSUMPTION_BASED: consumption_based_sharing_timeseries,
+    ValueSharingMethod.MARGINAL_CONTRIBUTION: marginal_contribution_sharing_timeseries,
+    ValueSharingMethod.SHAPLEY_VALUE: shapley_value_sharing_timeseries,
+    ValueSharingMethod.COOPERATIVE_GAME: cooperative_game_sharing_timeseries,
+}
+
+
+# Input dtype of each supported computation precision
+_PRECISIONS = {
+    'fp64': np.float64,
+    'fp32': np.float32,
+}
+
+
 def apply_value_sharing(
     consumption: np.ndarray,
     generation: np.ndarray,
@@ -42,7 +74,11 @@ def apply_value_sharing(
     fit_prices: np.ndarray,
     method: ValueSharingMethod = ValueSharingMethod.EQUAL,
     shapley_permutations: int = 100,
-    random_seed: Optional[int] = None
+    random_seed: Optional[int] = None,
+    shapley_tolerance: Optional[float] = None,
+    shapley_check_every: int = 100,
+    precision: str = 'fp64',
+    max_workers: Optional[int] = None
 ) -> Tuple[np.ndarray, Dict]:
     """
     Apply a value sharing method to energy community data.
@@ -53,8 +89,16 @@ def apply_value_sharing(
         tou_prices: Array [n_timestamps] of Time-of-Use prices [€/kWh]
         fit_prices: Array [n_timestamps] of Feed-in Tariff prices [€/kWh]
         method: Value sharing method to apply
-        shapley_permutations: Number of permutations for Shapley value (default: 100)
+        shapley_permutations: Number of permutations for Shapley value (default: 100),
+            the maximum when a tolerance is given
         random_seed: Random seed for reproducibility (used in Shapley)
+        shapley_tolerance: Stop Shapley sampling once the mean relative change of the
+            values is below this (default: None, always use shapley_permutations)
+        shapley_check_every: Permutations between Shapley convergence checks
+        precision: Floating point precision of the computations, 'fp64' (default)
+            or 'fp32' (half the memory traffic, about 7 significant digits)
+        max_workers: Maximum number of worker processes of the Shapley sampling
+            (default: number of CPUs, 1 runs serially)
     
     Returns:
         Tuple of:
@@ -62,8 +106,18 @@ def apply_value_sharing(
             - summary: Dictionary with aggregated metrics and method information
     
     Raises:
-        ValueError: If method is not recognized or inputs have incompatible shapes
+        ValueError: If method or precision is not recognized or inputs have incompatible shapes
     """
+    dtype = _PRECISIONS.get(precision)
+    if dtype is None:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {list(_PRECISIONS)})")
+    
+    # Canonical C-contiguous inputs of the requested precision for the vectorized models
+    consumption = np.ascontiguousarray(consumption, dtype=dtype)
+    generation = np.ascontiguousarray(generation, dtype=dtype)
+    tou_prices = np.ascontiguousarray(tou_prices, dtype=dtype)
+    fit_prices = np.ascontiguousarray(fit_prices, dtype=dtype)
+    
     # Validate inputs
     if consumption.shape != generation.shape:
         raise ValueError("Consumption and generation arrays must have the same shape")
@@ -77,30 +131,21 @@ def apply_value_sharing(
         raise ValueError(f"FiT prices length ({len(fit_prices)}) must match number of timestamps ({n_timestamps})")
     
     # Apply selected method
-    if method == ValueSharingMethod.EQUAL:
-        return equal_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
-    
-    elif method == ValueSharingMethod.GENERATION_BASED:
-        return generation_based_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
-    
-    elif method == ValueSharingMethod.CONSUMPTION_BASED:
-        return consumption_based_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
-    
-    elif method == ValueSharingMethod.MARGINAL_CONTRIBUTION:
-        return marginal_contribution_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
+    sharing_timeseries = _DISPATCH.get(method)
+    if sharing_timeseries is None:
+        raise ValueError(f"Unknown value sharing method: {method}")
     
-    elif method == ValueSharingMethod.SHAPLEY_VALUE:
-        return shapley_value_sharing_timeseries(
+    if method == ValueSharingMethod.SHAPLEY_VALUE:
+        return sharing_timeseries(
             consumption, generation, tou_prices, fit_prices,
             n_permutations=shapley_permutations,
-            random_seed=random_seed
+            random_seed=random_seed,
+            tolerance=shapley_tolerance,
+            check_every=shapley_check_every,
+            max_workers=max_workers
         )
     
-    elif method == ValueSharingMethod.COOPERATIVE_GAME:
-        return cooperative_game_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
-    
-    else:
-        raise ValueError(f"Unknown value sharing method: {method}")
+    return sharing_timeseries(consumption, generation, tou_prices, fit_prices)
 
 
 def compare_value_sharing_methods(
@@ -110,11 +155,18 @@ def compare_value_sharing_methods(
     fit_prices: np.ndarray,
     methods: Optional[list] = None,
     shapley_permutations: int = 100,
-    random_seed: Optional[int] = None
+    random_seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    shapley_tolerance: Optional[float] = None,
+    shapley_check_every: int = 100
 ) -> Dict:
     """
     Compare multiple value sharing methods side-by-side.
     
+    The methods are independent, so for large inputs they run in parallel
+    worker processes (one method per task); small inputs, a single method
+    or `max_workers=1` run serially.
+    
     Args:
         consumption: 2D array [n_members x n_timestamps] of consumption data
         generation: 2D array [n_members x n_timestamps] of generation data
@@ -123,6 +175,11 @@ def compare_value_sharing_methods(
         methods: List of ValueSharingMethod to compare (default: all methods)
         shapley_permutations: Number of permutations for Shapley value
         random_seed: Random seed for reproducibility
+        max_workers: Maximum number of worker processes (default: number of CPUs,
+            never more than the number of methods); also bounds the Shapley
+            workers when the methods run serially
+        shapley_tolerance: Convergence tolerance for Shapley sampling (see apply_value_sharing)
+        shapley_check_every: Permutations between Shapley convergence checks
     
     Returns:
         Dictionary with results for each method:
@@ -132,16 +189,26 @@ def compare_value_sharing_methods(
     if methods is None:
         methods = list(ValueSharingMethod)
     
+    run_method = partial(
+        apply_value_sharing, consumption, generation, tou_prices, fit_prices,
+        shapley_permutations=shapley_permutations,
+        random_seed=random_seed,
+        shapley_tolerance=shapley_tolerance,
+        shapley_check_every=shapley_check_every
+    )
+    
+    if len(methods) > 1 and max_workers != 1 and np.size(consumption) >= PARALLEL_MIN_SIZE:
+        # One worker per method at most, idle workers would only cost start-up time
+        n_workers = min(len(methods), max_workers or os.cpu_count() or 1)
+        # Shapley runs serially inside its worker rather than starting a nested pool
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            method_results = list(executor.map(partial(run_method, max_workers=1), methods))
+    else:
+        method_results = [run_method(method, max_workers=max_workers) for method in methods]
+    
     results = {}
     
-    for method in methods:
-        allocations, summary = apply_value_sharing(
-            consumption, generation, tou_prices, fit_prices,
-            method=method,
-            shapley_permutations=shapley_permutations,
-            random_seed=random_seed
-        )
-        
+    for method, (allocations, summary) in zip(methods, method_results):
         results[method.value] = {
             'allocations': allocations,
             'summary': summary
@@ -150,6 +217,33 @@ def compare_value_sharing_methods(
     return results
 
 
+def stack_method_summaries(results: Dict) -> Dict:
+    """
+    Stack the summaries of compare_value_sharing_methods into arrays.
+    
+    One entry per method, in the order of `results`, so methods can be
+    compared with array operations instead of traversing the summary dicts.
+    
+    Args:
+        results: Dictionary returned by compare_value_sharing_methods
+    
+    Returns:
+        Dictionary with:
+            - methods: array of method identifiers [n_methods]
+            - total_community_gain: array [n_methods]
+            - avg_gain_per_timestamp: array [n_methods]
+            - total_allocations_per_member: 2D array [n_methods x n_members]
+    """
+    summaries = [method_results['summary'] for method_results in results.values()]
+    
+    return {
+        'methods': np.array(list(results)),
+        'total_community_gain': np.array([summary['total_community_gain'] for summary in summaries], dtype=float),
+        'avg_gain_per_timestamp': np.array([summary['avg_gain_per_timestamp'] for summary in summaries], dtype=float),
+        'total_allocations_per_member': np.array([summary['total_allocations_per_member'] for summary in summaries], dtype=float)
+    }
+
+
 def export_value_sharing_results(
     allocations: np.ndarray,
     summary: Dict,
@@ -176,14 +270,18 @@ def export_value_sharing_results(
     if timestamps is None:
         timestamps = list(range(n_timestamps))
     
-    # Per-member results
-    member_results = {}
-    for i, member_id in enumerate(member_ids):
-        member_results[member_id] = {
-            'allocations_per_timestamp': allocations[i, :].tolist(),
-            'total_allocation': float(summary['total_allocations_per_member'][i]),
-            'average_allocation': float(np.mean(allocations[i, :]))
+    # Per-member results, rows and averages converted in one call each
+    rows = allocations.tolist()
+    totals = np.asarray(summary['total_allocations_per_member'], dtype=float).tolist()
+    averages = np.mean(allocations, axis=1).tolist()
+    member_results = {
+        member_id: {
+            'allocations_per_timestamp': rows[i],
+            'total_allocation': totals[i],
+            'average_allocation': averages[i]
         }
+        for i, member_id in enumerate(member_ids)
+    }
     
     # Aggregate results
     return {
@@ -197,3 +295,36 @@ def export_value_sharing_results(
                            if k not in ['method', 'total_community_gain', 
                                        'avg_gain_per_timestamp', 'total_allocations_per_member']}
     }
+
+
+def _json_default(value):
+    """Convert NumPy arrays and scalars for the json fallback."""
+    if isinstance(value, (np.ndarray, np.generic)):
+        if value.dtype in (np.float16, np.float32):
+            # orjson writes the shortest repr of the narrow float, not of its float64 value
+            return value.astype(str).astype(float).tolist()
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_value_sharing_results(path, export_data: Dict) -> None:
+    """
+    Write exported value sharing results to a JSON file.
+    
+    Uses orjson when it is installed (NumPy values serialized natively),
+    otherwise the standard json module set up to write the same UTF-8 bytes:
+    2-space indent, non-ASCII kept as is and non-str keys converted to strings.
+    Both write finite floats with their shortest round-trip repr; only the
+    exponent notation of very small or large values and non-finite values
+    (null in orjson, NaN in json) differ.
+    
+    Args:
+        path: Output file path
+        export_data: Dictionary from export_value_sharing_results
+    """
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(export_data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            json.dump(export_data, f, indent=2, ensure_ascii=False, default=_json_default)
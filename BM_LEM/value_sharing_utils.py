@@ -4,10 +4,16 @@ Value Sharing Utilities
 Common utilities and calculations for all Value Sharing models.
 """
 
+import os
 import numpy as np
 from typing import Dict, List, Tuple
 
 
+# Cache budget for the timestamp tiles of the timeseries computations,
+# overridable through the VALUE_SHARING_L2_BYTES environment variable
+L2_CACHE_BYTES = int(os.environ.get('VALUE_SHARING_L2_BYTES', 256 * 1024))
+
+
 def compute_net_energy(consumption: np.ndarray, generation: np.ndarray) -> np.ndarray:
     """
     Compute net energy for each member.
@@ -124,33 +130,61 @@ def compute_all_individual_payments(
     Returns:
         Array of individual payments
     """
-    n_members = len(net_energy)
-    payments = np.zeros(n_members)
+    # Same rule as compute_individual_payment, applied to all members at once:
+    # the applicable price is selected first, then a single multiply in place
+    payments = np.where(net_energy > 0, tou_price, fit_price).astype(np.result_type(net_energy, np.float32), copy=False)
+    payments *= net_energy
+    return payments
+
+
+def compute_net_energy_gain(
+    net_energy: np.ndarray,
+    tou_price: float,
+    fit_price: float
+) -> float:
+    """
+    Compute the community gain of a group of members from their net energy.
     
-    for i in range(n_members):
-        payments[i] = compute_individual_payment(net_energy[i], tou_price, fit_price)
+    G = Σ_i Pay_i^0 - Pay_EC, with the net energy already computed, so
+    callers evaluating many groups subtract consumption and generation once.
     
-    return payments
+    Args:
+        net_energy: Array of net energy for each member of the group
+        tou_price: Time-of-Use price
+        fit_price: Feed-in tariff
+    
+    Returns:
+        Community gain of the group
+    """
+    # Coalitions are often only a few members, so the helper chain is inlined:
+    # Σ_i Pay_i^0 is ToU on the summed deficits plus FiT on the summed surpluses
+    deficit = np.maximum(net_energy, 0).sum()
+    community_net_energy = net_energy.sum()
+    individual_payments = tou_price * deficit + fit_price * (community_net_energy - deficit)
+    community_price = tou_price if community_net_energy > 0 else fit_price
+    return float(individual_payments - community_net_energy * community_price)
 
 
-def normalize_allocations(allocations: np.ndarray, target_sum: float) -> np.ndarray:
+def normalize_allocations(allocations: np.ndarray, target_sum, axis: int = 0) -> np.ndarray:
     """
     Normalize allocations to sum to target value.
     
     Args:
         allocations: Array of allocation values
-        target_sum: Target sum value
+        target_sum: Target sum value (one per slice when allocations is 2D)
+        axis: Axis along which allocations are summed (the member axis)
     
     Returns:
         Normalized allocations
     """
-    current_sum = np.sum(allocations)
+    current_sum = np.sum(allocations, axis=axis, keepdims=True)
+    no_sum = current_sum == 0
     
-    if current_sum == 0:
-        # Equal distribution if all zeros
-        return np.ones(len(allocations)) * (target_sum / len(allocations))
+    normalized = np.multiply(allocations, target_sum / np.where(no_sum, 1, current_sum))
     
-    return allocations * (target_sum / current_sum)
+    # Equal distribution where all allocations sum to zero
+    np.copyto(normalized, target_sum / allocations.shape[axis], where=no_sum)
+    return normalized
 
 
 def compute_timestamp_data(
@@ -194,3 +228,103 @@ def compute_timestamp_data(
         'community_payment': community_payment,
         'community_gain': community_gain
     }
+
+
+def compute_timeseries_data(
+    consumption: np.ndarray,
+    generation: np.ndarray,
+    tou_prices: np.ndarray,
+    fit_prices: np.ndarray
+) -> Dict:
+    """
+    Compute all derived quantities for every timestamp at once.
+    
+    Same quantities as compute_timestamp_data, evaluated column-wise on the
+    full [n_members x n_timestamps] matrices instead of one timestamp at a time.
+    
+    Args:
+        consumption: 2D array [n_members x n_timestamps]
+        generation: 2D array [n_members x n_timestamps]
+        tou_prices: Array of ToU prices for each timestamp [n_timestamps]
+        fit_prices: Array of FiT prices for each timestamp [n_timestamps]
+    
+    Returns:
+        Dictionary containing:
+            - net_energy: 2D array [n_members x n_timestamps]
+            - individual_payments: 2D array [n_members x n_timestamps]
+            - community_net_energy: array [n_timestamps]
+            - community_payment: array [n_timestamps]
+            - community_gain: array [n_timestamps]
+    """
+    tou_prices = np.asarray(tou_prices, dtype=float)
+    fit_prices = np.asarray(fit_prices, dtype=float)
+    
+    # Net energy for each member and timestamp
+    net_energy = compute_net_energy(consumption, generation)
+    
+    # Individual payments, prices broadcast along the timestamp axis
+    individual_payments = compute_all_individual_payments(net_energy, tou_prices, fit_prices)
+    
+    # Community aggregates per timestamp
+    community_net_energy = net_energy.sum(axis=0)
+    community_payment = compute_all_individual_payments(community_net_energy, tou_prices, fit_prices)
+    community_gain = individual_payments.sum(axis=0)
+    community_gain -= community_payment
+    
+    return {
+        'net_energy': net_energy,
+        'individual_payments': individual_payments,
+        'community_net_energy': community_net_energy,
+        'community_payment': community_payment,
+        'community_gain': community_gain
+    }
+
+
+def timestamp_tiles(n_members: int, n_timestamps: int, n_arrays: int = 6) -> List[slice]:
+    """
+    Split the timestamps into tiles whose working set fits in L2 cache.
+    
+    Args:
+        n_members: Number of members (rows of each working array)
+        n_timestamps: Number of timestamps
+        n_arrays: Number of [n_members x tile] float64 arrays alive at once
+    
+    Returns:
+        List of timestamp slices covering all timestamps
+    """
+    tile = max(1, L2_CACHE_BYTES // (n_arrays * max(n_members, 1) * 8))
+    return [slice(start, start + tile) for start in range(0, n_timestamps, tile)]
+
+
+def compute_community_gains(
+    consumption: np.ndarray,
+    generation: np.ndarray,
+    tou_prices: np.ndarray,
+    fit_prices: np.ndarray
+) -> np.ndarray:
+    """
+    Compute the community gain of every timestamp.
+    
+    Evaluates compute_timeseries_data tile by tile (see timestamp_tiles), so
+    the intermediate matrices stay in cache for long horizons.
+    
+    Args:
+        consumption: 2D array [n_members x n_timestamps]
+        generation: 2D array [n_members x n_timestamps]
+        tou_prices: Array of ToU prices for each timestamp [n_timestamps]
+        fit_prices: Array of FiT prices for each timestamp [n_timestamps]
+    
+    Returns:
+        Array of community gains [n_timestamps]
+    """
+    n_members, n_timestamps = consumption.shape
+    tou_prices = np.asarray(tou_prices, dtype=float)
+    fit_prices = np.asarray(fit_prices, dtype=float)
+    
+    community_gains = np.empty(n_timestamps)
+    for tile in timestamp_tiles(n_members, n_timestamps):
+        community_gains[tile] = compute_timeseries_data(
+            consumption[:, tile], generation[:, tile], tou_prices[tile], fit_prices[tile]
+        )['community_gain']
+    
+    return community_gains
@@ -22,8 +22,7 @@ END FOR
 
 import numpy as np
 from typing import Dict, Tuple
-from .value_sharing_utils import compute_timestamp_data
-from .vs_equal_sharing import equal_sharing
+from .value_sharing_utils import compute_timestamp_data, compute_community_gains
 
 
 def consumption_based_sharing(
@@ -58,7 +57,8 @@ def consumption_based_sharing(
     
     # If no consumption, apply equal sharing
     if total_consumption == 0:
-        return equal_sharing(consumption, generation, tou_price, fit_price)
+        # Equal share of the community gain computed above
+        return np.full(n_members, data['community_gain'] / n_members)
     
     # Compute consumption share for each member
     consumption_shares = consumption / total_consumption
@@ -91,34 +91,19 @@ def consumption_based_sharing_timeseries(
     """
     n_members, n_timestamps = consumption.shape
     
-    # Initialize allocations array
-    allocations = np.zeros((n_members, n_timestamps))
-    
-    # Track total gains and fallback counts
-    total_community_gains = np.zeros(n_timestamps)
-    equal_sharing_count = 0
-    
-    # Process each timestamp
-    for h in range(n_timestamps):
-        allocations[:, h] = consumption_based_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
-        
-        # Check if equal sharing was applied
-        if np.sum(consumption[:, h]) == 0:
-            equal_sharing_count += 1
+    # Community gain of every timestamp, computed in cache-sized timestamp tiles
+    total_community_gains = compute_community_gains(consumption, generation, tou_prices, fit_prices)
+    
+    # Gain per unit of consumption for each timestamp
+    total_consumption = np.sum(consumption, axis=0)
+    no_consumption = total_consumption == 0
+    equal_sharing_count = int(np.sum(no_consumption))
+    gain_per_unit = total_community_gains / np.where(no_consumption, 1, total_consumption)
+    gain_per_unit[no_consumption] = 0
+    
+    # Allocate gain proportional to consumption share, equal shares where nobody consumes
+    allocations = np.einsum('ih,h->ih', consumption, gain_per_unit)
+    allocations[:, no_consumption] = total_community_gains[no_consumption] / n_members
     
     # Compute summary statistics
     summary = {
@@ -39,7 +39,47 @@ END FOR
 
 import numpy as np
 from typing import Dict, Tuple
-from .value_sharing_utils import compute_timestamp_data, normalize_allocations
+from .value_sharing_utils import compute_timestamp_data, compute_timeseries_data, normalize_allocations, timestamp_tiles
+
+
+def cooperative_game_allocations(net_energy: np.ndarray, community_gain) -> np.ndarray:
+    """
+    Cooperative Game allocations from net energy and community gain.
+    
+    Works on a single timestamp (1D net energy, scalar gain) as well as on
+    all timestamps at once (2D [n_members x n_timestamps] net energy, one
+    gain per timestamp); members are always along the first axis.
+    
+    Args:
+        net_energy: Net energy of each member [kWh]
+        community_gain: Community gain [€]
+    
+    Returns:
+        Array of gain allocations with the shape of net_energy [€]
+    """
+    n_members = net_energy.shape[0]
+    
+    # Base allocation (equal sharing)
+    base = community_gain / n_members
+    
+    # Classify members
+    deficit_mask = net_energy > 0  # Positive net energy = deficit (consuming more)
+    surplus_mask = net_energy < 0  # Negative net energy = surplus (generating more)
+    
+    # Sums for deficit and surplus groups (surplus sum is negative)
+    deficit_sum = np.sum(net_energy, axis=0, where=deficit_mask)
+    surplus_sum = np.sum(net_energy, axis=0, where=surplus_mask)
+    
+    # Deficit members receive less than base, surplus members more, balanced members base
+    # (the shares q_D, q_S and then the allocations are built in one buffer)
+    allocations = np.divide(net_energy, np.where(deficit_sum > 0, deficit_sum, 1))
+    np.divide(net_energy, np.where(surplus_sum < 0, surplus_sum, 1), out=allocations, where=surplus_mask)  # Both are negative, ratio is positive
+    np.negative(allocations, out=allocations, where=~surplus_mask)  # Balanced members have a zero share
+    allocations += 1
+    allocations *= base
+    
+    # Normalize allocations to ensure they sum to total gain
+    return normalize_allocations(allocations, community_gain, axis=0)
 
 
 def cooperative_game_sharing(
@@ -68,51 +108,7 @@ def cooperative_game_sharing(
     # Compute all timestamp data
     data = compute_timestamp_data(consumption, generation, tou_price, fit_price)
     
-    # Number of members
-    n_members = len(consumption)
-    
-    # Base allocation (equal sharing)
-    base = data['community_gain'] / n_members
-    
-    # Net energy for each member
-    net_energy = data['net_energy']
-    
-    # Classify members
-    deficit_mask = net_energy > 0  # Positive net energy = deficit (consuming more)
-    surplus_mask = net_energy < 0  # Negative net energy = surplus (generating more)
-    balanced_mask = net_energy == 0  # Balanced
-    
-    # Compute sums for deficit and surplus groups
-    deficit_sum = np.sum(net_energy[deficit_mask]) if np.any(deficit_mask) else 0
-    surplus_sum = np.sum(net_energy[surplus_mask]) if np.any(surplus_mask) else 0  # Will be negative
-    
-    # Initialize allocations
-    allocations = np.zeros(n_members)
-    
-    # Allocate to each member based on their position
-    for i in range(n_members):
-        if deficit_mask[i]:
-            # Deficit member: receives less than base
-            if deficit_sum > 0:
-                q_D_i = net_energy[i] / deficit_sum
-                allocations[i] = (1 - q_D_i) * base
-            else:
-                allocations[i] = base
-                
-        elif surplus_mask[i]:
-            # Surplus member: receives more than base
-            if surplus_sum < 0:
-                q_S_i = net_energy[i] / surplus_sum  # Both are negative, ratio is positive
-                allocations[i] = (1 + q_S_i) * base
-            else:
-                allocations[i] = base
-                
-        else:
-            # Balanced member: receives base
-            allocations[i] = base
-    
-    # Normalize allocations to ensure they sum to total gain
-    allocations = normalize_allocations(allocations, data['community_gain'])
+    allocations = cooperative_game_allocations(data['net_energy'], data['community_gain'])
     
     return allocations
 
@@ -138,39 +134,27 @@ def cooperative_game_sharing_timeseries(
             - summary: Dictionary with aggregated metrics
     """
     n_members, n_timestamps = consumption.shape
-    
-    # Initialize allocations array
-    allocations = np.zeros((n_members, n_timestamps))
-    
-    # Track total gains and member classifications
-    total_community_gains = np.zeros(n_timestamps)
-    deficit_count = np.zeros(n_timestamps)
-    surplus_count = np.zeros(n_timestamps)
-    balanced_count = np.zeros(n_timestamps)
-    
-    # Process each timestamp
-    for h in range(n_timestamps):
-        allocations[:, h] = cooperative_game_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
+    tou_prices = np.asarray(tou_prices, dtype=float)
+    fit_prices = np.asarray(fit_prices, dtype=float)
+    
+    allocations = np.empty((n_members, n_timestamps))
+    total_community_gains = np.empty(n_timestamps)
+    deficit_count = np.empty(n_timestamps)
+    surplus_count = np.empty(n_timestamps)
+    balanced_count = np.empty(n_timestamps)
+    
+    # Timestamps are processed in cache-sized tiles, each fully vectorized
+    for tile in timestamp_tiles(n_members, n_timestamps):
+        data = compute_timeseries_data(consumption[:, tile], generation[:, tile], tou_prices[tile], fit_prices[tile])
+        net_energy = data['net_energy']
+        total_community_gains[tile] = data['community_gain']
         
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
+        allocations[:, tile] = cooperative_game_allocations(net_energy, data['community_gain'])
         
         # Count member types
-        net_energy = data['net_energy']
-        deficit_count[h] = np.sum(net_energy > 0)
-        surplus_count[h] = np.sum(net_energy < 0)
-        balanced_count[h] = np.sum(net_energy == 0)
+        deficit_count[tile] = np.sum(net_energy > 0, axis=0)
+        surplus_count[tile] = np.sum(net_energy < 0, axis=0)
+        balanced_count[tile] = np.sum(net_energy == 0, axis=0)
     
     # Compute summary statistics
     summary = {
@@ -14,7 +14,7 @@ END FOR
 
 import numpy as np
 from typing import Dict, Tuple
-from .value_sharing_utils import compute_timestamp_data
+from .value_sharing_utils import compute_timestamp_data, compute_community_gains
 
 
 def equal_sharing(
@@ -47,7 +47,7 @@ def equal_sharing(
     gain_per_member = data['community_gain'] / n_members
     
     # Allocate equal gain to all members
-    allocations = np.ones(n_members) * gain_per_member
+    allocations = np.full(n_members, gain_per_member)
     
     return allocations
 
@@ -74,29 +74,11 @@ def equal_sharing_timeseries(
     """
     n_members, n_timestamps = consumption.shape
     
-    # Initialize allocations array
-    allocations = np.zeros((n_members, n_timestamps))
+    # Community gain of every timestamp, computed in cache-sized timestamp tiles
+    total_community_gains = compute_community_gains(consumption, generation, tou_prices, fit_prices)
     
-    # Track total gains
-    total_community_gains = np.zeros(n_timestamps)
-    
-    # Process each timestamp
-    for h in range(n_timestamps):
-        allocations[:, h] = equal_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
+    # Equal sharing: every member receives the same share of each timestamp's gain
+    allocations = np.repeat((total_community_gains / n_members)[np.newaxis, :], n_members, axis=0)
     
     # Compute summary statistics
     summary = {
@@ -24,8 +24,7 @@ END FOR
 
 import numpy as np
 from typing import Dict, Tuple
-from .value_sharing_utils import compute_timestamp_data
-from .vs_equal_sharing import equal_sharing
+from .value_sharing_utils import compute_timestamp_data, compute_community_gains
 
 
 def generation_based_sharing(
@@ -60,7 +59,8 @@ def generation_based_sharing(
     
     # If no generation, apply equal sharing
     if total_generation == 0:
-        return equal_sharing(consumption, generation, tou_price, fit_price)
+        # Equal share of the community gain computed above
+        return np.full(n_members, data['community_gain'] / n_members)
     
     # Compute generation share for each member
     generation_shares = generation / total_generation
@@ -93,34 +93,19 @@ def generation_based_sharing_timeseries(
     """
     n_members, n_timestamps = consumption.shape
     
-    # Initialize allocations array
-    allocations = np.zeros((n_members, n_timestamps))
-    
-    # Track total gains and fallback counts
-    total_community_gains = np.zeros(n_timestamps)
-    equal_sharing_count = 0
-    
-    # Process each timestamp
-    for h in range(n_timestamps):
-        allocations[:, h] = generation_based_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
-        
-        # Check if equal sharing was applied
-        if np.sum(generation[:, h]) == 0:
-            equal_sharing_count += 1
+    # Community gain of every timestamp, computed in cache-sized timestamp tiles
+    total_community_gains = compute_community_gains(consumption, generation, tou_prices, fit_prices)
+    
+    # Gain per unit of generation for each timestamp
+    total_generation = np.sum(generation, axis=0)
+    no_generation = total_generation == 0
+    equal_sharing_count = int(np.sum(no_generation))
+    gain_per_unit = total_community_gains / np.where(no_generation, 1, total_generation)
+    gain_per_unit[no_generation] = 0
+    
+    # Allocate gain proportional to generation share, equal shares where nobody generates
+    allocations = np.einsum('ih,h->ih', generation, gain_per_unit)
+    allocations[:, no_generation] = total_community_gains[no_generation] / n_members
     
     # Compute summary statistics
     summary = {
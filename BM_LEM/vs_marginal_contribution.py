@@ -29,13 +29,12 @@ import numpy as np
 from typing import Dict, Tuple
 from .value_sharing_utils import (
     compute_timestamp_data,
+    compute_timeseries_data,
+    timestamp_tiles,
     compute_net_energy,
     compute_all_individual_payments,
-    compute_community_net_energy,
-    compute_community_payment,
-    compute_community_gain
+    compute_net_energy_gain
 )
-from .vs_equal_sharing import equal_sharing
 
 
 def compute_gain_without_member(
@@ -70,24 +69,43 @@ def compute_gain_without_member(
         # No community without this member
         return 0.0
     
-    # Compute net energy for subset
+    # Gain for subset
     net_energy_subset = compute_net_energy(consumption_subset, generation_subset)
+    return compute_net_energy_gain(net_energy_subset, tou_price, fit_price)
+
+
+def compute_gains_without_members(data: Dict, tou_price, fit_price) -> np.ndarray:
+    """
+    Compute the community gain without each member, for all members at once.
     
-    # Individual payments for subset
-    individual_payments_subset = compute_all_individual_payments(
-        net_energy_subset, tou_price, fit_price
-    )
+    Leaving member i out removes its individual payment from the sum and its
+    net energy from the community net energy, so every leave-one-out gain
+    follows from the full-community aggregates without recomputing subsets.
     
-    # Community aggregates for subset
-    community_net_energy_subset = compute_community_net_energy(net_energy_subset)
-    community_payment_subset = compute_community_payment(
-        community_net_energy_subset, tou_price, fit_price
-    )
+    Args:
+        data: Timestamp data of the full community (compute_timestamp_data, or
+              compute_timeseries_data for all timestamps at once)
+        tou_price: Time-of-Use price (one per timestamp for timeseries data)
+        fit_price: Feed-in tariff (one per timestamp for timeseries data)
     
-    # Gain for subset
-    gain_subset = compute_community_gain(individual_payments_subset, community_payment_subset)
+    Returns:
+        Community gain without each member, shaped like the net energy
+    """
+    individual_payments = data['individual_payments']
+    
+    if individual_payments.shape[0] == 1:
+        # No community without the only member
+        return np.zeros_like(individual_payments)
     
-    return gain_subset
+    # Payments of the remaining members
+    individual_payments_without = np.sum(individual_payments, axis=0) - individual_payments
+    
+    # The community payment follows the same ToU/FiT rule as an individual payment
+    community_payment_without = compute_all_individual_payments(
+        data['community_net_energy'] - data['net_energy'], tou_price, fit_price
+    )
+    
+    return individual_payments_without - community_payment_without
 
 
 def marginal_contribution_sharing(
@@ -115,27 +133,16 @@ def marginal_contribution_sharing(
     data = compute_timestamp_data(consumption, generation, tou_price, fit_price)
     full_gain = data['community_gain']
     
-    # Number of members
-    n_members = len(consumption)
-    
-    # Compute marginal contribution for each member
-    marginal_contributions = np.zeros(n_members)
-    
-    for i in range(n_members):
-        # Gain without member i
-        gain_without_i = compute_gain_without_member(
-            consumption, generation, i, tou_price, fit_price
-        )
-        
-        # Marginal contribution = full gain - gain without i
-        marginal_contributions[i] = full_gain - gain_without_i
+    # Marginal contribution = full gain - gain without i, for every member i
+    marginal_contributions = full_gain - compute_gains_without_members(data, tou_price, fit_price)
     
     # Sum of marginal contributions
     mc_sum = np.sum(marginal_contributions)
     
     # If MC sum is zero or very close to zero, apply equal sharing
     if abs(mc_sum) < 1e-10:
-        return equal_sharing(consumption, generation, tou_price, fit_price)
+        # Equal share of the community gain computed above
+        return np.full(len(consumption), full_gain / len(consumption))
     
     # Allocate gain proportional to marginal contribution
     allocations = (marginal_contributions / mc_sum) * full_gain
@@ -165,35 +172,32 @@ def marginal_contribution_sharing_timeseries(
     """
     n_members, n_timestamps = consumption.shape
     
-    # Initialize allocations array
-    allocations = np.zeros((n_members, n_timestamps))
+    tou_prices = np.asarray(tou_prices, dtype=float)
+    fit_prices = np.asarray(fit_prices, dtype=float)
     
-    # Track total gains and fallback counts
-    total_community_gains = np.zeros(n_timestamps)
+    allocations = np.empty((n_members, n_timestamps))
+    total_community_gains = np.empty(n_timestamps)
     equal_sharing_count = 0
     
-    # Process each timestamp
-    for h in range(n_timestamps):
-        allocations[:, h] = marginal_contribution_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
+    # Timestamps are processed in cache-sized tiles, each fully vectorized
+    for tile in timestamp_tiles(n_members, n_timestamps):
+        data = compute_timeseries_data(consumption[:, tile], generation[:, tile], tou_prices[tile], fit_prices[tile])
+        full_gain = data['community_gain']
+        total_community_gains[tile] = full_gain
         
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
+        # Marginal contributions of every member at every timestamp
+        marginal_contributions = full_gain - compute_gains_without_members(data, tou_prices[tile], fit_prices[tile])
+        mc_sum = np.sum(marginal_contributions, axis=0)
         
-        # Check if equal sharing was applied (MC sum was zero)
-        # We can detect this by checking if allocations are equal
-        if np.allclose(allocations[:, h], allocations[0, h]):
-            equal_sharing_count += 1
+        # Timestamps whose MC sum is zero fall back to equal sharing
+        fallback = np.abs(mc_sum) < 1e-10
+        safe_sum = np.where(fallback, 1.0, mc_sum)
+        allocations[:, tile] = np.where(
+            fallback,
+            full_gain / n_members,
+            marginal_contributions / safe_sum * full_gain
+        )
+        equal_sharing_count += int(np.sum(fallback))
     
     # Compute summary statistics
     summary = {
@@ -30,19 +30,26 @@ FOR each timestamp h DO
 END FOR
 """
 
+import os
 import numpy as np
-from typing import Dict, Tuple, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple, List, Optional
 from .value_sharing_utils import (
-    compute_net_energy,
     compute_all_individual_payments,
-    compute_community_net_energy,
     compute_community_payment,
-    compute_community_gain,
     compute_timestamp_data,
+    compute_timeseries_data,
+    compute_community_gains,
+    compute_net_energy_gain,
     normalize_allocations
 )
 
 
+# Timeseries needing fewer coalition evaluations than this (timestamps x
+# permutations x members) run serially, worker processes would not pay off
+PARALLEL_MIN_EVALUATIONS = 2_000_000
+
+
 def characteristic_function(
     consumption: np.ndarray,
     generation: np.ndarray,
@@ -68,24 +75,183 @@ def characteristic_function(
     if len(coalition_indices) == 0:
         return 0.0
     
-    # Subset for coalition
-    consumption_coalition = consumption[coalition_indices]
-    generation_coalition = generation[coalition_indices]
+    # Net energy of the coalition members
+    net_energy = consumption[coalition_indices] - generation[coalition_indices]
+    
+    return compute_net_energy_gain(net_energy, tou_price, fit_price)
+
+
+def characteristic_function_timeseries(
+    consumption: np.ndarray,
+    generation: np.ndarray,
+    coalition_mask: np.ndarray,
+    tou_prices: np.ndarray,
+    fit_prices: np.ndarray
+) -> float:
+    """
+    Compute characteristic function v(S) of a coalition over all timestamps.
+    
+    v(S) is separable per timestamp, so the coalition value over the horizon
+    is the sum of the per-timestamp values, computed in one pass over T.
+    
+    Args:
+        consumption: 2D array [n_members x n_timestamps]
+        generation: 2D array [n_members x n_timestamps]
+        coalition_mask: Boolean array [n_members], True for members in coalition S
+        tou_prices: Array of ToU prices for each timestamp [n_timestamps]
+        fit_prices: Array of FiT prices for each timestamp [n_timestamps]
+    
+    Returns:
+        Value of coalition summed over all timestamps
+    """
+    net_energy = consumption[coalition_mask] - generation[coalition_mask]
+    
+    # Σ_i Pay_i^0 and Pay_EC of the coalition at every timestamp
+    individual_payments = compute_all_individual_payments(net_energy, tou_prices, fit_prices).sum(axis=0)
+    community_payment = compute_all_individual_payments(net_energy.sum(axis=0), tou_prices, fit_prices)
+    
+    return float(np.sum(individual_payments - community_payment))
+
+
+def net_energy_characteristic_function(
+    net_energy: np.ndarray,
+    individual_payments: np.ndarray,
+    coalition_indices: List[int],
+    tou_price: float,
+    fit_price: float
+) -> float:
+    """
+    Compute characteristic function v(S) from precomputed member quantities.
+    
+    Args:
+        net_energy: Array of net energy for all members
+        individual_payments: Array of individual payments for all members
+        coalition_indices: List of member indices in coalition S
+        tou_price: Time-of-Use price
+        fit_price: Feed-in tariff
+    
+    Returns:
+        Value of coalition (gain from cooperation)
+    """
+    if len(coalition_indices) == 0:
+        return 0.0
+    
+    # Only reductions over the coalition members remain per evaluation
+    community_payment = compute_community_payment(
+        float(np.sum(net_energy[coalition_indices])), tou_price, fit_price
+    )
+    return float(np.sum(individual_payments[coalition_indices])) - community_payment
+
+
+def _shapley_kernel(
+    net_energy: np.ndarray,
+    individual_payments: np.ndarray,
+    permutations: np.ndarray,
+    tou_price: float,
+    fit_price: float
+) -> np.ndarray:
+    """
+    Sum the marginal contributions of every member over sampled permutations.
+    
+    Args:
+        net_energy: Array of net energy for all members
+        individual_payments: Array of individual payments for all members
+        permutations: 2D array of member orders [K x n_members]
+        tou_price: Time-of-Use price
+        fit_price: Feed-in tariff
     
-    # Compute net energy for coalition members
-    net_energy = compute_net_energy(consumption_coalition, generation_coalition)
+    Returns:
+        Array of summed marginal contributions for each member (not averaged)
+    """
+    # v(S) only depends on the sum of the members' individual payments and
+    # on the coalition net energy, so both are cumulated along every permutation
+    sum_payments = np.cumsum(individual_payments[permutations], axis=1)
+    sum_net_energy = np.cumsum(net_energy[permutations], axis=1)
     
-    # Individual payments (if acting alone)
-    individual_payments = compute_all_individual_payments(net_energy, tou_price, fit_price)
+    # Value of each growing coalition, for all permutations at once: the
+    # coalition payment overwrites the net energy buffer and is subtracted in place
+    np.multiply(sum_net_energy, np.where(sum_net_energy > 0, tou_price, fit_price), out=sum_net_energy)
+    values = sum_payments
+    values -= sum_net_energy
     
-    # Community aggregates for coalition
-    community_net_energy = compute_community_net_energy(net_energy)
-    community_payment = compute_community_payment(community_net_energy, tou_price, fit_price)
+    # Marginal contribution of the member added at each position
+    marginal_contributions = np.diff(values, axis=1, prepend=0.0)
     
-    # Coalition gain
-    coalition_gain = compute_community_gain(individual_payments, community_payment)
+    # Each row is a permutation, so every member receives one contribution per row
+    shapley_values = np.bincount(
+        permutations.ravel(),
+        weights=marginal_contributions.ravel(),
+        minlength=len(net_energy)
+    )
     
-    return coalition_gain
+    return shapley_values
+
+
+def _shapley_allocations(
+    net_energy: np.ndarray,
+    individual_payments: np.ndarray,
+    full_gain: float,
+    tou_price: float,
+    fit_price: float,
+    n_permutations: int,
+    rng: np.random.Generator,
+    tolerance: Optional[float] = None,
+    check_every: int = 100
+) -> Tuple[np.ndarray, int]:
+    """
+    Shapley Value allocation of one timestamp from precomputed member quantities.
+    
+    With a tolerance, permutations are sampled in batches of `check_every` and
+    sampling stops once the mean relative change of the estimate over a batch
+    is below the tolerance (or after `n_permutations`).
+    
+    Args:
+        net_energy: Array of net energy for all members
+        individual_payments: Array of individual payments for all members
+        full_gain: Community gain to distribute
+        tou_price: Time-of-Use price
+        fit_price: Feed-in tariff
+        n_permutations: Number of random permutations to sample (K), the maximum with a tolerance
+        rng: Random generator the permutations are drawn from
+        tolerance: Mean relative change below which sampling stops (None: always K)
+        check_every: Number of permutations between convergence checks
+    
+    Returns:
+        Tuple of:
+            - allocations: Array of gain allocations for each member [€]
+            - n_used: Number of permutations sampled
+    """
+    n_members = len(net_energy)
+    batch_size = n_permutations if tolerance is None else check_every
+    
+    shapley_totals = np.zeros(n_members)
+    previous_estimate = None
+    n_used = 0
+    
+    while n_used < n_permutations:
+        batch = min(batch_size, n_permutations - n_used)
+        
+        # Draw half of the batch at random and pair each with its reverse
+        # (antithetic sampling), which lowers the variance of the estimate
+        n_draws = (batch + 1) // 2
+        drawn = rng.permuted(np.tile(np.arange(n_members, dtype=np.int32), (n_draws, 1)), axis=1)
+        permutations = np.concatenate([drawn, drawn[:, ::-1]])[:batch]
+        
+        # Accumulate marginal contributions over the sampled permutations
+        shapley_totals += _shapley_kernel(net_energy, individual_payments, permutations, tou_price, fit_price)
+        n_used += batch
+        
+        # Average over all permutations so far
+        shapley_values = shapley_totals / n_used
+        
+        if previous_estimate is not None:
+            relative_change = np.abs(shapley_values - previous_estimate) / np.maximum(np.abs(shapley_values), 1e-12)
+            if np.mean(relative_change) < tolerance:
+                break
+        previous_estimate = shapley_values
+    
+    # Normalize to distribute full gain
+    return normalize_allocations(shapley_totals / n_used, full_gain), n_used
 
 
 def shapley_value_sharing(
@@ -94,74 +260,99 @@ def shapley_value_sharing(
     tou_price: float,
     fit_price: float,
     n_permutations: int = 100,
-    random_seed: int = None
+    random_seed: int = None,
+    tolerance: Optional[float] = None,
+    check_every: int = 100
 ) -> np.ndarray:
     """
     Shapley Value allocation (approximate via sampling).
     
     Uses Monte Carlo sampling over random permutations to approximate Shapley values.
+    Permutations are drawn in antithetic pairs (each with its reverse).
     
     Args:
         consumption: Array of consumption values for each member [kWh]
         generation: Array of generation values for each member [kWh]
         tou_price: Time-of-Use price [€/kWh]
         fit_price: Feed-in tariff [€/kWh]
-        n_permutations: Number of random permutations to sample (K)
+        n_permutations: Number of random permutations to sample (K), the maximum with a tolerance
         random_seed: Random seed for reproducibility
+        tolerance: Stop early once the mean relative change of the Shapley
+            values over `check_every` permutations is below this (default: never)
+        check_every: Number of permutations between convergence checks
     
     Returns:
         Array of gain allocations for each member [€]
     """
-    # Set random seed if provided
-    if random_seed is not None:
-        np.random.seed(random_seed)
-    
     # Compute all timestamp data for full community
     data = compute_timestamp_data(consumption, generation, tou_price, fit_price)
-    full_gain = data['community_gain']
     
-    # Number of members
-    n_members = len(consumption)
+    allocations, _ = _shapley_allocations(
+        data['net_energy'],
+        data['individual_payments'],
+        data['community_gain'],
+        tou_price,
+        fit_price,
+        n_permutations,
+        np.random.default_rng(random_seed),
+        tolerance,
+        check_every
+    )
     
-    # Initialize Shapley values
-    shapley_values = np.zeros(n_members)
+    return allocations
+
+
+def _shapley_timestamps(
+    consumption: np.ndarray,
+    generation: np.ndarray,
+    tou_prices: np.ndarray,
+    fit_prices: np.ndarray,
+    seeds: List[np.random.SeedSequence],
+    n_permutations: int,
+    tolerance: Optional[float] = None,
+    check_every: int = 100
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Apply Shapley Value Sharing to every column of a block of timestamps.
     
-    # Sample K random permutations
-    for k in range(n_permutations):
-        # Generate random permutation of member indices
-        permutation = np.random.permutation(n_members)
-        
-        # Current coalition (starts empty)
-        coalition = []
-        
-        # Process each member in permutation order
-        for i in permutation:
-            # Value of coalition before adding member i
-            value_before = characteristic_function(
-                consumption, generation, coalition, tou_price, fit_price
-            )
-            
-            # Add member i to coalition
-            coalition.append(i)
-            
-            # Value of coalition after adding member i
-            value_after = characteristic_function(
-                consumption, generation, coalition, tou_price, fit_price
-            )
-            
-            # Marginal contribution of member i in this permutation
-            marginal_contribution = value_after - value_before
-            
-            # Accumulate to Shapley value
-            shapley_values[i] += marginal_contribution
-    
-    # Average over all permutations
-    shapley_values = shapley_values / n_permutations
+    Args:
+        consumption: 2D array [n_members x n_block]
+        generation: 2D array [n_members x n_block]
+        tou_prices: Array of ToU prices for each timestamp [n_block]
+        fit_prices: Array of FiT prices for each timestamp [n_block]
+        seeds: Seed sequence of each timestamp
+        n_permutations: Number of random permutations per timestamp
+        tolerance: Convergence tolerance (None: always n_permutations)
+        check_every: Number of permutations between convergence checks
     
-    # Normalize to distribute full gain
-    allocations = normalize_allocations(shapley_values, full_gain)
+    Returns:
+        Tuple of:
+            - allocations: 2D array of gain allocations [n_members x n_block]
+            - n_used: Array of permutations sampled per timestamp [n_block]
+    """
+    # Member quantities of the whole block as [n_members x n_block] arrays
+    data = compute_timeseries_data(consumption, generation, tou_prices, fit_prices)
+    allocations = np.empty(consumption.shape)
+    n_used = np.empty(len(seeds), dtype=int)
     
-    return allocations
+    # Timestamp-major copies, so that each timestamp's members are contiguous
+    net_energy = np.ascontiguousarray(data['net_energy'].T)
+    individual_payments = np.ascontiguousarray(data['individual_payments'].T)
+    
+    for h, seed in enumerate(seeds):
+        allocations[:, h], n_used[h] = _shapley_allocations(
+            net_energy[h],
+            individual_payments[h],
+            data['community_gain'][h],
+            tou_prices[h],
+            fit_prices[h],
+            n_permutations,
+            np.random.default_rng(seed),
+            tolerance,
+            check_every
+        )
+    
+    return allocations, n_used
 
 
 def shapley_value_sharing_timeseries(
@@ -170,18 +361,29 @@ def shapley_value_sharing_timeseries(
     tou_prices: np.ndarray,
     fit_prices: np.ndarray,
     n_permutations: int = 100,
-    random_seed: int = None
+    random_seed: int = None,
+    max_workers: Optional[int] = None,
+    tolerance: Optional[float] = None,
+    check_every: int = 100
 ) -> Tuple[np.ndarray, Dict]:
     """
     Apply Shapley Value Sharing across multiple timestamps.
     
+    Timestamps are independent, so for large workloads they are split into
+    blocks processed by worker processes; small workloads or `max_workers=1`
+    run serially. Seeded results do not depend on the split.
+    
     Args:
         consumption: 2D array [n_members x n_timestamps]
         generation: 2D array [n_members x n_timestamps]
         tou_prices: Array of ToU prices for each timestamp [n_timestamps]
         fit_prices: Array of FiT prices for each timestamp [n_timestamps]
-        n_permutations: Number of random permutations per timestamp
+        n_permutations: Number of random permutations per timestamp (the maximum with a tolerance)
         random_seed: Random seed for reproducibility
+        max_workers: Maximum number of worker processes (default: number of CPUs)
+        tolerance: Stop a timestamp early once the mean relative change of its
+            Shapley values over `check_every` permutations is below this (default: never)
+        check_every: Number of permutations between convergence checks
     
     Returns:
         Tuple of:
@@ -193,31 +395,47 @@ def shapley_value_sharing_timeseries(
     # Initialize allocations array
     allocations = np.zeros((n_members, n_timestamps))
     
-    # Track total gains
-    total_community_gains = np.zeros(n_timestamps)
+    # Community gain of every timestamp, computed once for the summary
+    total_community_gains = compute_community_gains(consumption, generation, tou_prices, fit_prices)
     
-    # Process each timestamp
-    for h in range(n_timestamps):
-        # Use different seed for each timestamp if base seed provided
-        timestamp_seed = None if random_seed is None else random_seed + h
-        
-        allocations[:, h] = shapley_value_sharing(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h],
-            n_permutations=n_permutations,
-            random_seed=timestamp_seed
-        )
-        
-        # Record community gain for this timestamp
-        data = compute_timestamp_data(
-            consumption[:, h],
-            generation[:, h],
-            tou_prices[h],
-            fit_prices[h]
-        )
-        total_community_gains[h] = data['community_gain']
+    # Only timestamps with a gain to share are processed, the others keep zero allocations
+    active = np.flatnonzero(total_community_gains != 0)
+    
+    parallel = max_workers != 1 and len(active) * n_permutations * n_members >= PARALLEL_MIN_EVALUATIONS
+    
+    # Independent random stream for each timestamp, spawned from the base seed
+    # (fresh entropy when None), so no global random state is shared; streams are
+    # spawned for all timestamps so that each keeps its own whichever are active
+    all_seeds = np.random.SeedSequence(random_seed).spawn(n_timestamps)
+    seeds = [all_seeds[h] for h in active]
+    
+    if parallel:
+        n_blocks = max_workers or os.cpu_count() or 1
+        blocks = np.array_split(active, n_blocks)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            block_results = list(executor.map(
+                _shapley_timestamps,
+                [consumption[:, block] for block in blocks],
+                [generation[:, block] for block in blocks],
+                [tou_prices[block] for block in blocks],
+                [fit_prices[block] for block in blocks],
+                np.array_split(seeds, n_blocks),
+                [n_permutations] * n_blocks,
+                [tolerance] * n_blocks,
+                [check_every] * n_blocks
+            ))
+    else:
+        blocks = [active]
+        block_results = [_shapley_timestamps(
+            consumption[:, active], generation[:, active],
+            tou_prices[active], fit_prices[active],
+            seeds, n_permutations, tolerance, check_every
+        )]
+    
+    permutations_used = np.full(n_timestamps, n_permutations)
+    for block, (block_allocation, block_used) in zip(blocks, block_results):
+        allocations[:, block] = block_allocation
+        permutations_used[block] = block_used
     
     # Compute summary statistics
     summary = {
@@ -225,6 +443,7 @@ def shapley_value_sharing_timeseries(
         'total_community_gain': np.sum(total_community_gains),
         'avg_gain_per_timestamp': np.mean(total_community_gains),
         'n_permutations': n_permutations,
+        'avg_permutations_used': np.mean(permutations_used[active]) if len(active) else 0.0,
         'method': 'Shapley Value (Approximate)'
     }
     
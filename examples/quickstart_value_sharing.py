@@ -12,7 +12,7 @@ import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from BM_LEM.value_sharing import apply_value_sharing, ValueSharingMethod
+from BM_LEM.value_sharing import compare_value_sharing_methods, ValueSharingMethod
 
 # Example: 3 households, 24 hours
 # Member 0: Pure consumer (no solar)
@@ -54,12 +54,15 @@ print(f"  Total consumption: {np.sum(consumption):.2f} kWh")
 print(f"  Total generation: {np.sum(generation):.2f} kWh")
 print()
 
+# Run all methods in one call on the same inputs
+results = compare_value_sharing_methods(
+    consumption, generation, tou_prices, fit_prices,
+    methods=[method for _, method in methods],
+    shapley_permutations=50  # Fast computation
+)
+
 for name, method in methods:
-    allocations, summary = apply_value_sharing(
-        consumption, generation, tou_prices, fit_prices,
-        method=method,
-        shapley_permutations=50  # Fast computation
-    )
+    summary = results[method.value]['summary']
     
     print(f"{name}:")
     print(f"  Community gain: €{summary['total_community_gain']:.2f}")
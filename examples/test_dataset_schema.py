@@ -0,0 +1,128 @@
+"""
+Basic Tests for the Dataset Schema
+==================================
+
+Run these tests to verify the implementation is working correctly.
+"""
+
+from datetime import datetime, timedelta, timezone
+import sys
+import os
+import warnings
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import MemberData, DatasetMetadata, ECDataset, ECDatasetSoA
+
+
+def create_dataset(n_members=3, n_timestamps=4, tz=None):
+    """Small dataset with rows grouped by member, so they are not in time order."""
+    start = datetime(2025, 1, 1, tzinfo=tz)
+    member_ids = [f"M{i}" for i in range(n_members)]
+    member_data = [
+        MemberData(member_id=member_id, timestamp=start + timedelta(hours=t),
+                   consumption=1.0 + i + t, generation=0.5 * t)
+        for i, member_id in enumerate(member_ids)
+        for t in range(n_timestamps)
+    ]
+    metadata = DatasetMetadata(
+        n_members=n_members,
+        member_ids=member_ids,
+        time_resolution="1h",
+        start_date=start,
+        end_date=start + timedelta(hours=n_timestamps - 1),
+        available_columns=["member_id", "timestamp", "consumption", "generation"]
+    )
+    return ECDataset(metadata=metadata, member_data=member_data)
+
+
+def test_reindex_after_item_assignment():
+    """Test that reindex picks up rows replaced in place."""
+    print("Testing index rebuild...")
+    
+    dataset = create_dataset()
+    assert len(dataset.get_member_data("M0")) == 4
+    
+    # Item assignment keeps the list and its length, so the index is stale until reindex
+    dataset.member_data[0] = MemberData(member_id="M9", timestamp=datetime(2024, 12, 31),
+                                        consumption=1.0, generation=0.0)
+    dataset.reindex()
+    member_rows = dataset.get_member_data("M9")
+    range_rows = dataset.get_timerange_data(datetime(2024, 12, 31), datetime(2024, 12, 31, 12))
+    
+    if len(member_rows) == 1 and len(dataset.get_member_data("M0")) == 3 and range_rows == member_rows:
+        print("  ✓ Reindex after item assignment: PASS")
+    else:
+        print("  ✗ Reindex after item assignment: FAIL")
+    assert len(member_rows) == 1
+    assert len(dataset.get_member_data("M0")) == 3
+    assert range_rows == member_rows
+    
+    print()
+
+
+def rows_as_tuples(rows):
+    """Rows of either layout as sorted (member_id, UTC timestamp, consumption, generation) tuples."""
+    if isinstance(rows, dict):
+        columns = (rows["member_id"], rows["timestamp"], rows["consumption"], rows["generation"])
+        return sorted(zip(*(column.tolist() for column in columns)))
+    return sorted(
+        (d.member_id, np.datetime64(d.timestamp.astimezone(timezone.utc).replace(tzinfo=None) if d.timestamp.tzinfo else d.timestamp, "ns").item(),
+         d.consumption, d.generation)
+        for d in rows
+    )
+
+
+def test_soa_matches_dataset():
+    """Test that ECDatasetSoA answers the same queries as ECDataset."""
+    print("Testing struct-of-arrays dataset...")
+    
+    # Naive timestamps, and aware ones at UTC+2 queried with UTC bounds
+    cases = {
+        "naive": (create_dataset(), None),
+        "tz-aware": (create_dataset(tz=timezone(timedelta(hours=2))), timezone(timedelta(hours=2)))
+    }
+    
+    for name, (dataset, tz) in cases.items():
+        # NumPy only warns when it converts aware datetimes itself
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            soa = ECDatasetSoA.from_records(dataset.member_data)
+        start = datetime(2025, 1, 1, 1, tzinfo=tz)
+        end = datetime(2025, 1, 1, 2, tzinfo=tz)
+        if tz is not None:
+            start, end = start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            range_data = soa.get_timerange_data(start, end)
+        
+        matches = (
+            rows_as_tuples(soa._select(slice(None))) == rows_as_tuples(dataset.member_data)
+            and rows_as_tuples(soa.get_member_data("M1")) == rows_as_tuples(dataset.get_member_data("M1"))
+            and rows_as_tuples(range_data) == rows_as_tuples(dataset.get_timerange_data(start, end))
+            and len(range_data["member_id"]) == 6
+        )
+        if matches:
+            print(f"  ✓ {name}: PASS")
+        else:
+            print(f"  ✗ {name}: FAIL")
+        assert matches
+    
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Dataset Schema Tests")
+    print("=" * 70)
+    print()
+    
+    test_reindex_after_item_assignment()
+    test_soa_matches_dataset()
+    
+    print("=" * 70)
+    print("All tests completed!")
+    print("=" * 70)
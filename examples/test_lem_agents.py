@@ -0,0 +1,55 @@
+"""
+Basic Tests for the LEM Agent Model
+===================================
+
+Run these tests to verify the implementation is working correctly.
+"""
+
+import datetime
+import sys
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# mesa and LEM_utils are needed to import the model
+pytest.importorskip("mesa")
+pytest.importorskip("LEM_utils")
+from BM_LEM.LEM_agents import LEMCommunity
+
+
+def test_filter_time_steps_dst():
+    """Test that the time window is applied on wall-clock time on a DST day."""
+    print("Testing time window filtering on a DST transition day...")
+    
+    # Clocks jump from 02:00 to 03:00 in Berlin on 2025-03-30
+    time_steps = list(pd.date_range("2025-03-30", periods=24, freq="h", tz="Europe/Berlin"))
+    model = SimpleNamespace(time_steps=time_steps)
+    window = (datetime.time(6, 0), datetime.time(10, 0))
+    hours = [ts.hour for ts in LEMCommunity._filter_time_steps(model, window)]
+    
+    if hours == [6, 7, 8, 9, 10]:
+        print("  ✓ Wall-clock window on DST day: PASS")
+    else:
+        print("  ✗ Wall-clock window on DST day: FAIL")
+        print(f"    Hours: {hours}")
+    assert hours == [6, 7, 8, 9, 10]
+    
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running LEM Agent Model Tests")
+    print("=" * 70)
+    print()
+    
+    test_filter_time_steps_dst()
+    
+    print("=" * 70)
+    print("All tests completed!")
+    print("=" * 70)
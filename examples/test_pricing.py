@@ -0,0 +1,150 @@
+"""
+Basic Tests for Pricing Mechanisms
+==================================
+
+Run these tests to verify the implementation is working correctly.
+"""
+
+import numpy as np
+import pandas as pd
+import pymarket as pm
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BM_LEM import pricing_AUP
+from BM_LEM.pricing_P2 import record_tradable_bids
+from BM_LEM.pricing_COLM import constrained_optimization_lagrange_multipliers
+from BM_LEM.pricing_VCG import vickrey_clarke_groves
+
+
+def test_p2_records_each_bid_once():
+    """Test that P2 records every tradable bid at most once."""
+    print("Testing P2 transaction recording...")
+    
+    # Two buyers (3 kWh) against two sellers (2 kWh)
+    ids = np.array([0, 1, 2, 3])
+    q = np.array([2.0, 1.0, 1.5, 0.5])
+    p = np.array([0.30, 0.25, 0.10, 0.20])
+    buying = np.array([True, True, False, False])
+    
+    trans, extra = record_tradable_bids(ids, q, p, buying)
+    df = trans.get_df()
+    traded = df['quantity'].sum()
+    
+    if abs(traded - 2 * extra['clearing quantity']) < 1e-9 and df['bid'].is_unique:
+        print("  ✓ Each bid recorded once: PASS")
+    else:
+        print("  ✗ Each bid recorded once: FAIL")
+        print(f"    Traded: {traded}, clearing quantity: {extra['clearing quantity']}")
+    assert abs(traded - 2 * extra['clearing quantity']) < 1e-9
+    assert df['bid'].is_unique
+    
+    print()
+
+
+def uncovered_bids():
+    """Uncovered bids where the buyers demand more than the sellers offer."""
+    return pd.DataFrame({
+        'quantity': [1.0, 2.0, 0.6, 2.0],
+        'price': [0.30, 0.25, 0.10, 0.20],
+        'user': [0, 1, 2, 3],
+        'buying': [True, True, False, False],
+    })
+
+
+def test_colm_does_not_over_trade():
+    """Test that COLM never trades more than a bid's quantity."""
+    print("Testing COLM matching...")
+    
+    bids = uncovered_bids()
+    offered = bids['quantity'].copy()
+    trans = pm.TransactionManager()
+    constrained_optimization_lagrange_multipliers(bids, trans, cap=100, floor=0)
+    traded = trans.get_df().groupby('bid')['quantity'].sum().reindex(bids.index, fill_value=0)
+    
+    if (traded <= offered + 1e-9).all() and (bids['quantity'] >= -1e-9).all():
+        print("  ✓ No over-trading: PASS")
+    else:
+        print("  ✗ No over-trading: FAIL")
+        print(f"    Traded: {traded.tolist()}, offered: {offered.tolist()}")
+    assert (traded <= offered + 1e-9).all()
+    assert (bids['quantity'] >= -1e-9).all()
+    
+    print()
+
+
+def test_vcg_does_not_over_trade():
+    """Test that VCG never trades more than a bid's quantity."""
+    print("Testing VCG matching...")
+    
+    bids = uncovered_bids()
+    offered = bids['quantity'].copy()
+    trans = pm.TransactionManager()
+    vickrey_clarke_groves(bids, trans, cap=100, floor=0, MP=0.2)
+    traded = trans.get_df().groupby('bid')['quantity'].sum().reindex(bids.index, fill_value=0)
+    
+    if (traded <= offered + 1e-9).all() and (bids['quantity'] >= -1e-9).all():
+        print("  ✓ No over-trading: PASS")
+    else:
+        print("  ✗ No over-trading: FAIL")
+        print(f"    Traded: {traded.tolist()}, offered: {offered.tolist()}")
+    assert (traded <= offered + 1e-9).all()
+    assert (bids['quantity'] >= -1e-9).all()
+    
+    print()
+
+
+def test_aup_stuck_prices_keep_reporting():
+    """Test that AUP reports every iteration when prices are stuck at FIT/TOU without trades."""
+    print("Testing AUP with stuck prices...")
+    
+    # Buyer at TOU and seller at FIT, in a market that clears nothing
+    bids = pd.DataFrame({
+        'quantity': [1.0, 1.0],
+        'price': [0.25, 0.10],
+        'user': [0, 1],
+        'buying': [True, False],
+        'time': [0, 0],
+        'divisible': [True, True]
+    })
+    calls = []
+    def no_trades(current_bids):
+        calls.append(current_bids)
+        return pm.TransactionManager(), {'clearing price': None, 'clearing quantity': 0}
+    
+    clear, pricing_AUP.uniform_price_mechanism = pricing_AUP.uniform_price_mechanism, no_trades
+    try:
+        _, extra = pricing_AUP.adjusted_uniform_price_mechanism(bids, FIT=0.10, TOU=0.25, max_iterations=5)
+    finally:
+        pricing_AUP.uniform_price_mechanism = clear
+    iterations = [entry['iteration'] for entry in extra['results_log']]
+    
+    if iterations == [1, 2, 3, 4, 5] and extra['clearing price'] is None and len(calls) == 1:
+        print("  ✓ All iterations reported, one clearing run: PASS")
+    else:
+        print("  ✗ All iterations reported, one clearing run: FAIL")
+        print(f"    Iterations: {iterations}, clearing runs: {len(calls)}")
+    assert iterations == [1, 2, 3, 4, 5]
+    assert extra['clearing price'] is None
+    assert len(calls) == 1
+    
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Pricing Mechanism Tests")
+    print("=" * 70)
+    print()
+    
+    test_p2_records_each_bid_once()
+    test_colm_does_not_over_trade()
+    test_vcg_does_not_over_trade()
+    test_aup_stuck_prices_keep_reporting()
+    
+    print("=" * 70)
+    print("All tests completed!")
+    print("=" * 70)
@@ -0,0 +1,52 @@
+"""
+Basic Tests for the Pseudocode Models
+=====================================
+
+Run these tests to verify the implementation is working correctly.
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Pseudocode, PseudocodeFunction, PseudocodeStatement, StatementType
+
+
+def test_markdown_indentation():
+    """Test that statements are indented by level and negative levels are not."""
+    print("Testing markdown indentation...")
+    
+    levels = [0, 2, -1, 1]
+    statements = [
+        PseudocodeStatement(line_number=i, type=StatementType.ASSIGNMENT, content=f"x{i} = {i}", indentation_level=level)
+        for i, level in enumerate(levels)
+    ]
+    pseudocode = Pseudocode(
+        model_name="Test",
+        main_algorithm=PseudocodeFunction(name="main", description="Main", statements=statements)
+    )
+    lines = pseudocode.to_markdown().split("\n")
+    expected = ["  " * level + stmt.content for level, stmt in zip(levels, statements)]
+    
+    if all(line in lines for line in expected):
+        print("  ✓ Indentation per level: PASS")
+    else:
+        print("  ✗ Indentation per level: FAIL")
+    assert all(line in lines for line in expected)
+    
+    print()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("Running Pseudocode Model Tests")
+    print("=" * 70)
+    print()
+    
+    test_markdown_indentation()
+    
+    print("=" * 70)
+    print("All tests completed!")
+    print("=" * 70)
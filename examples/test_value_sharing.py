@@ -8,11 +8,29 @@ Run these tests to verify the implementation is working correctly.
 import numpy as np
 import sys
 import os
+import tempfile
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from BM_LEM.value_sharing import apply_value_sharing, ValueSharingMethod
+from BM_LEM import value_sharing, vs_shapley_value
+from BM_LEM.value_sharing import (
+    apply_value_sharing,
+    compare_value_sharing_methods,
+    stack_method_summaries,
+    ValueSharingMethod,
+    export_value_sharing_results,
+    dump_value_sharing_results
+)
+from BM_LEM.value_sharing_utils import compute_timestamp_data, compute_timeseries_data
+from BM_LEM.vs_cooperative_game import cooperative_game_allocations
+from BM_LEM.vs_marginal_contribution import (
+    compute_gain_without_member,
+    compute_gains_without_members,
+    marginal_contribution_sharing,
+    marginal_contribution_sharing_timeseries
+)
+from BM_LEM.vs_shapley_value import shapley_value_sharing_timeseries
 
 
 def test_basic_functionality():
@@ -206,6 +224,343 @@ def test_reproducibility():
     print()
 
 
+def test_cooperative_game_allocations():
+    """Test that the cooperative game allocations work per timestamp and for all at once."""
+    print("Testing cooperative game allocations...")
+    
+    # Deficit, surplus and balanced members
+    net_energy = np.array([[1.0, 0.5, 0.0], [-2.0, 0.0, -1.0], [0.0, -0.5, 2.0], [1.0, 1.0, -1.0]])
+    community_gain = np.array([0.3, 0.1, 0.2])
+    
+    allocations = cooperative_game_allocations(net_energy, community_gain)
+    per_timestamp = np.column_stack([
+        cooperative_game_allocations(net_energy[:, h], community_gain[h]) for h in range(net_energy.shape[1])
+    ])
+    surplus_favored = allocations[1, 0] > allocations[2, 0] > allocations[0, 0]
+    
+    if np.allclose(allocations, per_timestamp) and np.allclose(allocations.sum(axis=0), community_gain) and surplus_favored:
+        print("  ✓ Cooperative game allocations: PASS")
+    else:
+        print("  ✗ Cooperative game allocations: FAIL")
+    assert np.allclose(allocations, per_timestamp)
+    assert np.allclose(allocations.sum(axis=0), community_gain)
+    assert surplus_favored
+    
+    print()
+
+
+def test_compare_methods_parallel():
+    """Test that comparing methods in worker processes matches the serial comparison."""
+    print("Testing method comparison...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((4, 6)) * 2
+    generation = rng.random((4, 6)) * 2
+    tou_prices = np.full(6, 0.25)
+    fit_prices = np.full(6, 0.10)
+    
+    # Run even this small input in worker processes
+    min_size, value_sharing.PARALLEL_MIN_SIZE = value_sharing.PARALLEL_MIN_SIZE, 0
+    try:
+        serial, parallel = [
+            compare_value_sharing_methods(
+                consumption, generation, tou_prices, fit_prices,
+                shapley_permutations=20,
+                random_seed=5,
+                max_workers=max_workers
+            )
+            for max_workers in (1, 2)
+        ]
+    finally:
+        value_sharing.PARALLEL_MIN_SIZE = min_size
+    
+    matches = list(serial) == list(parallel) and all(
+        np.array_equal(serial[name]['allocations'], parallel[name]['allocations']) for name in serial
+    )
+    if matches:
+        print("  ✓ Parallel matches serial: PASS")
+    else:
+        print("  ✗ Parallel matches serial: FAIL")
+    assert matches
+    
+    print()
+
+
+def test_stack_method_summaries():
+    """Test that stacked summaries hold one row per method in result order."""
+    print("Testing stacked method summaries...")
+    
+    consumption = np.array([[1.0, 2.0], [2.0, 1.0], [0.5, 1.5]])
+    generation = np.array([[0.5, 0.5], [0.0, 0.0], [3.0, 0.2]])
+    tou_prices = np.array([0.25, 0.25])
+    fit_prices = np.array([0.10, 0.10])
+    methods = [ValueSharingMethod.EQUAL, ValueSharingMethod.CONSUMPTION_BASED, ValueSharingMethod.COOPERATIVE_GAME]
+    
+    results = compare_value_sharing_methods(consumption, generation, tou_prices, fit_prices, methods=methods)
+    stacked = stack_method_summaries(results)
+    
+    matches = (
+        stacked['methods'].tolist() == [method.value for method in methods]
+        and stacked['total_allocations_per_member'].shape == (3, 3)
+        and all(
+            np.allclose(stacked['total_allocations_per_member'][k], results[name]['summary']['total_allocations_per_member'])
+            and stacked['total_community_gain'][k] == results[name]['summary']['total_community_gain']
+            and stacked['avg_gain_per_timestamp'][k] == results[name]['summary']['avg_gain_per_timestamp']
+            for k, name in enumerate(results)
+        )
+    )
+    if matches:
+        print("  ✓ Stacked summaries: PASS")
+    else:
+        print("  ✗ Stacked summaries: FAIL")
+    assert matches
+    
+    print()
+
+
+def test_leave_one_out_gains():
+    """Test that the leave-one-out gains match the per-member subset computation."""
+    print("Testing leave-one-out gains...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((5, 8)) * 2
+    generation = rng.random((5, 8)) * 2
+    tou_prices = np.full(8, 0.25)
+    fit_prices = np.full(8, 0.10)
+    
+    # One timestamp at a time, all timestamps at once, and a single member
+    timeseries_gains = compute_gains_without_members(
+        compute_timeseries_data(consumption, generation, tou_prices, fit_prices), tou_prices, fit_prices
+    )
+    matches = True
+    for h in range(consumption.shape[1]):
+        c, g = consumption[:, h], generation[:, h]
+        expected = [compute_gain_without_member(c, g, i, tou_prices[h], fit_prices[h]) for i in range(len(c))]
+        gains = compute_gains_without_members(compute_timestamp_data(c, g, tou_prices[h], fit_prices[h]), tou_prices[h], fit_prices[h])
+        matches &= np.allclose(gains, expected) and np.allclose(timeseries_gains[:, h], expected)
+    single = compute_gains_without_members(compute_timestamp_data(consumption[:1, 0], generation[:1, 0], 0.25, 0.10), 0.25, 0.10)
+    matches &= np.array_equal(single, [0.0])
+    
+    if matches:
+        print("  ✓ Leave-one-out gains: PASS")
+    else:
+        print("  ✗ Leave-one-out gains: FAIL")
+    assert matches
+    
+    print()
+
+
+def test_marginal_contribution_timeseries():
+    """Test that the vectorized timeseries matches the per-timestamp allocation."""
+    print("Testing marginal contribution timeseries...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((5, 8)) * 2
+    generation = rng.random((5, 8)) * 2
+    # Two timestamps without a gain: no generation, and every member balanced
+    generation[:, 0] = 0.0
+    consumption[:, 1] = generation[:, 1]
+    tou_prices = np.linspace(0.20, 0.30, 8)
+    fit_prices = np.full(8, 0.10)
+    
+    allocations, _ = marginal_contribution_sharing_timeseries(consumption, generation, tou_prices, fit_prices)
+    expected = np.column_stack([
+        marginal_contribution_sharing(consumption[:, h], generation[:, h], tou_prices[h], fit_prices[h])
+        for h in range(consumption.shape[1])
+    ])
+    
+    if np.allclose(allocations, expected):
+        print("  ✓ Timeseries matches per-timestamp: PASS")
+    else:
+        print("  ✗ Timeseries matches per-timestamp: FAIL")
+        print(f"    Max difference: {np.max(np.abs(allocations - expected))}")
+    assert np.allclose(allocations, expected)
+    
+    print()
+
+
+def test_shapley_parallel_matches_serial():
+    """Test that seeded Shapley values do not depend on the worker processes."""
+    print("Testing parallel Shapley...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((5, 12)) * 2
+    generation = rng.random((5, 12)) * 2
+    tou_prices = np.full(12, 0.25)
+    fit_prices = np.full(12, 0.10)
+    
+    # Run even this small workload in worker processes
+    min_evaluations, vs_shapley_value.PARALLEL_MIN_EVALUATIONS = vs_shapley_value.PARALLEL_MIN_EVALUATIONS, 0
+    try:
+        results = [
+            shapley_value_sharing_timeseries(
+                consumption, generation, tou_prices, fit_prices,
+                n_permutations=20,
+                random_seed=3,
+                max_workers=max_workers
+            )[0]
+            for max_workers in (1, 3)
+        ]
+    finally:
+        vs_shapley_value.PARALLEL_MIN_EVALUATIONS = min_evaluations
+    
+    if np.array_equal(results[0], results[1]):
+        print("  ✓ Parallel matches serial: PASS")
+    else:
+        print("  ✗ Parallel matches serial: FAIL")
+        print(f"    Max difference: {np.max(np.abs(results[0] - results[1]))}")
+    assert np.array_equal(results[0], results[1])
+    
+    print()
+
+
+def test_shapley_streams_per_timestamp():
+    """Test that a timestamp's seeded Shapley values do not depend on the other timestamps."""
+    print("Testing Shapley random streams...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((5, 6)) * 2
+    generation = rng.random((5, 6)) * 2
+    tou_prices = np.full(6, 0.25)
+    fit_prices = np.full(6, 0.10)
+    
+    alloc1, _ = apply_value_sharing(
+        consumption, generation, tou_prices, fit_prices,
+        method=ValueSharingMethod.SHAPLEY_VALUE,
+        shapley_permutations=20,
+        random_seed=7
+    )
+    
+    # No gain to share at the first timestamp, which is then skipped
+    generation[:, 0] = 0.0
+    alloc2, _ = apply_value_sharing(
+        consumption, generation, tou_prices, fit_prices,
+        method=ValueSharingMethod.SHAPLEY_VALUE,
+        shapley_permutations=20,
+        random_seed=7
+    )
+    
+    if np.array_equal(alloc1[:, 1:], alloc2[:, 1:]):
+        print("  ✓ Other timestamps unchanged: PASS")
+    else:
+        print("  ✗ Other timestamps unchanged: FAIL")
+        print(f"    Max difference: {np.max(np.abs(alloc1[:, 1:] - alloc2[:, 1:]))}")
+    assert np.array_equal(alloc1[:, 1:], alloc2[:, 1:])
+    
+    print()
+
+
+def test_shapley_convergence():
+    """Test that Shapley sampling stops early once the values converge."""
+    print("Testing Shapley convergence stopping...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((6, 24)) * 2
+    generation = rng.random((6, 24)) * 2
+    tou_prices = np.full(24, 0.25)
+    fit_prices = np.full(24, 0.10)
+    
+    allocations, summary = apply_value_sharing(
+        consumption, generation, tou_prices, fit_prices,
+        method=ValueSharingMethod.SHAPLEY_VALUE,
+        shapley_permutations=5000,
+        random_seed=1,
+        shapley_tolerance=1e-3,
+        shapley_check_every=50
+    )
+    used = summary['avg_permutations_used']
+    balanced = abs(np.sum(allocations) - summary['total_community_gain']) < 1e-6
+    
+    if 0 < used < 5000 and balanced:
+        print(f"  ✓ Stopped after {used:.0f} permutations on average: PASS")
+    else:
+        print("  ✗ Early stopping: FAIL")
+        print(f"    Permutations used: {used}")
+    assert 0 < used < 5000
+    assert balanced
+    
+    print()
+
+
+def test_fp32_precision():
+    """Test that fp32 results stay within 1e-6 of fp64 for every method."""
+    print("Testing fp32 precision...")
+    
+    rng = np.random.default_rng(0)
+    consumption = rng.random((6, 24)) * 2
+    generation = rng.random((6, 24)) * 2
+    tou_prices = np.full(24, 0.25)
+    fit_prices = np.full(24, 0.10)
+    
+    for method in ValueSharingMethod:
+        results = [
+            apply_value_sharing(
+                consumption, generation, tou_prices, fit_prices,
+                method=method,
+                shapley_permutations=50,
+                random_seed=1,
+                precision=precision
+            )[0]
+            for precision in ('fp64', 'fp32')
+        ]
+        max_difference = np.max(np.abs(results[0] - results[1]))
+        
+        if max_difference < 1e-6:
+            print(f"  ✓ {method.value}: PASS")
+        else:
+            print(f"  ✗ {method.value}: FAIL")
+            print(f"    Max difference: {max_difference}")
+        assert max_difference < 1e-6
+    
+    print()
+
+
+def test_dump_matches_json_fallback():
+    """Test that the orjson and json writers produce the same bytes."""
+    print("Testing result dumps...")
+    
+    if value_sharing.orjson is None:
+        print("  - Skipped, orjson not installed")
+        print()
+        return
+    
+    consumption = np.array([[1.0, 2.0], [2.0, 1.0], [0.5, 1.5]])
+    generation = np.array([[0.5, 0.5], [0.0, 0.0], [3.0, 0.2]])
+    tou_prices = np.array([0.25, 0.25])
+    fit_prices = np.array([0.10, 0.10])
+    allocations, summary = apply_value_sharing(
+        consumption, generation, tou_prices, fit_prices,
+        method=ValueSharingMethod.CONSUMPTION_BASED
+    )
+    
+    # Integer and non-ASCII member ids, fp32 arrays and NumPy scalars
+    export_data = export_value_sharing_results(allocations, summary, member_ids=[1, 2, 'Zoë'])
+    export_data['fp32_allocations'] = allocations.astype(np.float32)
+    export_data['n_members'] = np.int64(3)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        orjson_path = os.path.join(tmp, 'orjson.json')
+        json_path = os.path.join(tmp, 'json.json')
+        dump_value_sharing_results(orjson_path, export_data)
+        orjson_module, value_sharing.orjson = value_sharing.orjson, None
+        try:
+            dump_value_sharing_results(json_path, export_data)
+        finally:
+            value_sharing.orjson = orjson_module
+        with open(orjson_path, 'rb') as f:
+            orjson_bytes = f.read()
+        with open(json_path, 'rb') as f:
+            json_bytes = f.read()
+    
+    if orjson_bytes == json_bytes:
+        print("  ✓ orjson and json output identical: PASS")
+    else:
+        print("  ✗ orjson and json output identical: FAIL")
+    assert orjson_bytes == json_bytes
+    
+    print()
+
+
 if __name__ == "__main__":
     print("=" * 70)
     print("Running Value Sharing Model Tests")
@@ -217,6 +572,16 @@ if __name__ == "__main__":
     test_allocation_properties()
     test_equal_sharing_property()
     test_reproducibility()
+    test_cooperative_game_allocations()
+    test_compare_methods_parallel()
+    test_stack_method_summaries()
+    test_leave_one_out_gains()
+    test_marginal_contribution_timeseries()
+    test_shapley_parallel_matches_serial()
+    test_shapley_streams_per_timestamp()
+    test_shapley_convergence()
+    test_fp32_precision()
+    test_dump_matches_json_fallback()
     
     print("=" * 70)
     print("All tests completed!")
@@ -8,6 +8,7 @@ This example demonstrates how to use the value sharing models with sample data.
 import numpy as np
 import sys
 import os
+from functools import lru_cache
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,6 +17,8 @@ from BM_LEM.value_sharing import (
     apply_value_sharing,
     compare_value_sharing_methods,
     export_value_sharing_results,
+    dump_value_sharing_results,
+    stack_method_summaries,
     ValueSharingMethod
 )
 
@@ -31,39 +34,57 @@ def create_sample_data(n_members=5, n_timestamps=24):
     Returns:
         Tuple of (consumption, generation, tou_prices, fit_prices)
     """
-    np.random.seed(42)
+    rng = np.random.default_rng(42)
+    
+    # Hour masks, built once and shared by the load, solar and price profiles
+    hours = np.arange(n_timestamps)
+    day_hours = (hours >= 6) & (hours <= 22)
+    daylight = (hours >= 6) & (hours <= 18)
+    peak_hours = ((hours >= 7) & (hours <= 10)) | ((hours >= 17) & (hours <= 20))
     
     # Consumption patterns (kWh)
     # Higher during day hours, lower at night
-    base_consumption = np.random.uniform(0.5, 2.0, (n_members, n_timestamps))
-    day_hours = (np.arange(n_timestamps) >= 6) & (np.arange(n_timestamps) <= 22)
-    base_consumption[:, day_hours] *= 1.5
+    # Filled in place in a preallocated C-order float64 buffer
+    base_consumption = np.empty((n_members, n_timestamps), dtype=np.float64, order='C')
+    rng.random(out=base_consumption)
+    base_consumption *= 1.5
+    base_consumption += 0.5  # uniform in [0.5, 2.0)
+    base_consumption *= np.where(day_hours, 1.5, 1.0)
     
     # Generation patterns (kWh)
-    # Solar generation: zero at night, peak around midday
-    generation = np.zeros((n_members, n_timestamps))
-    for h in range(n_timestamps):
-        if 6 <= h <= 18:  # Daylight hours
-            # Bell curve peaking at hour 12
-            solar_factor = np.exp(-((h - 12) ** 2) / 20)
-            generation[:, h] = np.random.uniform(0, 3.0, n_members) * solar_factor
+    # Solar generation: zero at night, bell curve peaking at hour 12 in daylight hours
+    solar_factor = np.where(daylight, np.exp(-((hours - 12.0) ** 2) / 20.0), 0.0)
+    generation = np.empty((n_members, n_timestamps), dtype=np.float64, order='C')
+    rng.random(out=generation)
+    generation *= 3.0 * solar_factor  # uniform in [0, 3.0) scaled per hour
     
     # Not all members have generation
     generation[0:2, :] = 0  # First 2 members are pure consumers
     
     # Time-of-Use prices (€/kWh)
-    tou_prices = np.ones(n_timestamps) * 0.20  # Base price
-    peak_hours = ((np.arange(n_timestamps) >= 7) & (np.arange(n_timestamps) <= 10)) | \
-                 ((np.arange(n_timestamps) >= 17) & (np.arange(n_timestamps) <= 20))
+    tou_prices = np.full(n_timestamps, 0.20)  # Base price
     tou_prices[peak_hours] = 0.30  # Peak price
     tou_prices[~day_hours] = 0.15  # Off-peak price
     
     # Feed-in Tariff (€/kWh)
-    fit_prices = np.ones(n_timestamps) * 0.10  # Constant FiT
+    fit_prices = np.full(n_timestamps, 0.10)  # Constant FiT
     
     return base_consumption, generation, tou_prices, fit_prices
 
 
+@lru_cache(maxsize=None)
+def _sample(n_members=5, n_timestamps=24):
+    """
+    Sample data shared by the examples, created once per size.
+    
+    The arrays are read-only; copy them before modifying.
+    """
+    data = create_sample_data(n_members=n_members, n_timestamps=n_timestamps)
+    for array in data:
+        array.setflags(write=False)
+    return data
+
+
 def example_single_method():
     """Example: Apply a single value sharing method."""
     print("=" * 70)
@@ -71,7 +92,7 @@ def example_single_method():
     print("=" * 70)
     
     # Create sample data
-    consumption, generation, tou_prices, fit_prices = create_sample_data(
+    consumption, generation, tou_prices, fit_prices = _sample(
         n_members=5, n_timestamps=24
     )
     
@@ -106,7 +127,7 @@ def example_compare_methods():
     print("=" * 70)
     
     # Create sample data
-    consumption, generation, tou_prices, fit_prices = create_sample_data(
+    consumption, generation, tou_prices, fit_prices = _sample(
         n_members=5, n_timestamps=24
     )
     
@@ -123,15 +144,15 @@ def example_compare_methods():
     print("\nComparison of all methods:")
     print("-" * 70)
     
+    # Variance in allocations (measure of fairness), for all methods at once
+    variances = np.var(stack_method_summaries(results)['total_allocations_per_member'], axis=1)
+    
     # Display summary for each method
-    for method_name, method_results in results.items():
+    for method_results, variance in zip(results.values(), variances):
         summary = method_results['summary']
         print(f"\n{summary['method']}:")
         print(f"  Total gain: €{summary['total_community_gain']:.2f}")
         print(f"  Allocations: {summary['total_allocations_per_member']}")
-        
-        # Calculate variance in allocations (measure of fairness)
-        variance = np.var(summary['total_allocations_per_member'])
         print(f"  Variance: {variance:.4f}")
     
     return results
@@ -144,7 +165,7 @@ def example_specific_methods():
     print("=" * 70)
     
     # Create sample data
-    consumption, generation, tou_prices, fit_prices = create_sample_data(
+    consumption, generation, tou_prices, fit_prices = _sample(
         n_members=10, n_timestamps=48  # 2 days, hourly data
     )
     
@@ -188,7 +209,7 @@ def example_export_results():
     print("=" * 70)
     
     # Create sample data
-    consumption, generation, tou_prices, fit_prices = create_sample_data(
+    consumption, generation, tou_prices, fit_prices = _sample(
         n_members=3, n_timestamps=24
     )
     
@@ -221,11 +242,9 @@ def example_export_results():
         print(f"    Average allocation: €{member_data['average_allocation']:.4f}")
     
     # This export_data can be easily converted to JSON or CSV
-    import json
     print("\n(Results can be exported to JSON)")
     # Uncomment to save:
-    # with open('value_sharing_results.json', 'w') as f:
-    #     json.dump(export_data, f, indent=2)
+    # dump_value_sharing_results('value_sharing_results.json', export_data)
 
 
 if __name__ == "__main__":
@@ -6,15 +6,16 @@ from .dataset_schema import (
     CommunityData,
     Tariff,
     DatasetMetadata,
-    ECDataset
+    ECDataset,
+    ECDatasetSoA
+)
+from .paper_spec import (
+    ModelType,
+    Variable,
+    Equation,
+    Algorithm,
+    PaperSpec
 )
-from .paper_spec import (
-    ModelType,
-    Variable,
-    Equation,
-    Algorithm,
-    PaperSpec
-)
 from .pseudocode import (
     StatementType,
     PseudocodeStatement,
@@ -30,12 +31,13 @@ __all__ = [
     "Tariff",
     "DatasetMetadata",
     "ECDataset",
-    # Paper spec models
-    "ModelType",
-    "Variable",
-    "Equation",
-    "Algorithm",
-    "PaperSpec",
+    "ECDatasetSoA",
+    # Paper spec models
+    "ModelType",
+    "Variable",
+    "Equation",
+    "Algorithm",
+    "PaperSpec",
     # Pseudocode models
     "StatementType",
     "PseudocodeStatement",
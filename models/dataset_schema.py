@@ -1,41 +1,56 @@
 """
 Data models for energy community dataset schema.
 """
-from typing import List, Optional, Dict
-from pydantic import BaseModel, Field
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Annotated, List, Optional, Dict
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, TypeAdapter
+from datetime import datetime, timezone
 
 
-class MemberData(BaseModel):
+@lru_cache(maxsize=None)
+def _record_adapter(record_type: type) -> TypeAdapter:
+    """Validator of a record type, built once per type."""
+    return TypeAdapter(record_type)
+
+
+class _Record:
+    """Base of the per-timestamp records, validated by pydantic inside an ECDataset or via from_row."""
+    __slots__ = ()
+    __pydantic_config__ = ConfigDict(populate_by_name=True)
+    
+    @classmethod
+    def from_row(cls, row: Dict):
+        """Validate a record from a row keyed by field names or aliases."""
+        return _record_adapter(cls).validate_python(row)
+
+
+@dataclass(slots=True)
+class MemberData(_Record):
     """Data for a single energy community member."""
     member_id: str
     timestamp: datetime
-    consumption: float = Field(..., alias="C_i^t", description="Load/consumption in kWh")
-    generation: float = Field(..., alias="G_i^t", description="Generation in kWh")
-    
-    class Config:
-        populate_by_name = True
+    consumption: Annotated[float, Field(alias="C_i^t", description="Load/consumption in kWh")]
+    generation: Annotated[float, Field(alias="G_i^t", description="Generation in kWh")]
 
 
-class CommunityData(BaseModel):
+@dataclass(slots=True)
+class CommunityData(_Record):
     """Aggregated community-level data."""
     timestamp: datetime
-    total_consumption: float = Field(..., alias="C_ec^t", description="Community consumption in kWh")
-    total_generation: float = Field(..., alias="G_ec^t", description="Community generation in kWh")
-    
-    class Config:
-        populate_by_name = True
+    total_consumption: Annotated[float, Field(alias="C_ec^t", description="Community consumption in kWh")]
+    total_generation: Annotated[float, Field(alias="G_ec^t", description="Community generation in kWh")]
 
 
-class Tariff(BaseModel):
+@dataclass(slots=True)
+class Tariff(_Record):
     """Energy tariff information."""
     timestamp: datetime
-    time_of_use: float = Field(..., alias="ToU^t", description="Grid purchase price (€/kWh)")
-    feed_in_tariff: float = Field(..., alias="FiT^t", description="Grid sale price (€/kWh)")
-    internal_tariff: Optional[float] = Field(None, alias="P^t", description="Internal trading price (€/kWh)")
-    
-    class Config:
-        populate_by_name = True
+    time_of_use: Annotated[float, Field(alias="ToU^t", description="Grid purchase price (€/kWh)")]
+    feed_in_tariff: Annotated[float, Field(alias="FiT^t", description="Grid sale price (€/kWh)")]
+    internal_tariff: Annotated[Optional[float], Field(alias="P^t", description="Internal trading price (€/kWh)")] = None
 
 
 class DatasetMetadata(BaseModel):
@@ -61,16 +76,124 @@ class DatasetMetadata(BaseModel):
 
 
 class ECDataset(BaseModel):
-    """Complete energy community dataset."""
+    """
+    Complete energy community dataset.
+    
+    Member and time range lookups use indices built on first use. They are
+    rebuilt when member_data is replaced or changes length, but not when a row
+    is replaced in place (member_data[i] = ...) or a record is edited; call
+    reindex() after such changes.
+    """
     metadata: DatasetMetadata
     member_data: List[MemberData] = Field(default_factory=list)
     community_data: Optional[List[CommunityData]] = None
     tariffs: List[Tariff] = Field(default_factory=list)
     
+    # Row indices of each member and rows in time order, built on first lookup
+    _member_index: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    _time_order: List[int] = PrivateAttr(default_factory=list)
+    _sorted_timestamps: List[datetime] = PrivateAttr(default_factory=list)
+    _indexed_data: Optional[List[MemberData]] = PrivateAttr(default=None)
+    _indexed_length: int = PrivateAttr(default=0)
+    
+    def _build_index(self, force: bool = False) -> None:
+        """(Re)build the lookup indices if member_data was replaced or resized since."""
+        if not force and self._indexed_data is self.member_data and self._indexed_length == len(self.member_data):
+            return
+        
+        member_index = {}
+        for row, d in enumerate(self.member_data):
+            member_index.setdefault(d.member_id, []).append(row)
+        
+        self._member_index = member_index
+        self._time_order = sorted(range(len(self.member_data)), key=lambda row: self.member_data[row].timestamp)
+        self._sorted_timestamps = [self.member_data[row].timestamp for row in self._time_order]
+        self._indexed_data = self.member_data
+        self._indexed_length = len(self.member_data)
+    
+    def reindex(self) -> None:
+        """Rebuild the lookup indices after member_data was modified in place."""
+        self._build_index(force=True)
+    
     def get_member_data(self, member_id: str) -> List[MemberData]:
         """Get all data for a specific member."""
-        return [d for d in self.member_data if d.member_id == member_id]
+        self._build_index()
+        return [self.member_data[row] for row in self._member_index.get(member_id, [])]
     
     def get_timerange_data(self, start: datetime, end: datetime) -> List[MemberData]:
         """Get data within a specific time range."""
-        return [d for d in self.member_data if start <= d.timestamp <= end]
+        self._build_index()
+        lo = bisect_left(self._sorted_timestamps, start)
+        hi = bisect_right(self._sorted_timestamps, end)
+        
+        # Rows are returned in their member_data order
+        return [self.member_data[row] for row in sorted(self._time_order[lo:hi])]
+    
+    def to_soa(self) -> "ECDatasetSoA":
+        """Get the member data as parallel arrays for vectorized queries."""
+        return ECDatasetSoA.from_records(self.member_data)
+
+
+def _utc_naive(timestamp):
+    """Timezone-aware datetimes as naive UTC, since np.datetime64 has no timezone."""
+    if isinstance(timestamp, datetime) and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+@dataclass
+class ECDatasetSoA:
+    """
+    Member data stored as parallel arrays, sorted by timestamp.
+    
+    Timezone-aware timestamps, including the bounds of get_timerange_data, are
+    converted to UTC and stored as naive datetime64; naive ones are kept as given.
+    """
+    member_ids: np.ndarray
+    timestamps: np.ndarray
+    consumption: np.ndarray
+    generation: np.ndarray
+    
+    def __post_init__(self):
+        self.member_ids = np.asarray(self.member_ids, dtype=str)
+        if not np.issubdtype(np.asarray(self.timestamps).dtype, np.datetime64):
+            self.timestamps = [_utc_naive(t) for t in self.timestamps]
+        self.timestamps = np.asarray(self.timestamps, dtype="datetime64[ns]")
+        self.consumption = np.asarray(self.consumption, dtype=np.float64)
+        self.generation = np.asarray(self.generation, dtype=np.float64)
+        
+        # Sorted timestamps let time ranges be found by binary search
+        if np.any(self.timestamps[1:] < self.timestamps[:-1]):
+            order = np.argsort(self.timestamps, kind="stable")
+            self.member_ids = self.member_ids[order]
+            self.timestamps = self.timestamps[order]
+            self.consumption = self.consumption[order]
+            self.generation = self.generation[order]
+    
+    @classmethod
+    def from_records(cls, records: List[MemberData]) -> "ECDatasetSoA":
+        """Build the arrays from a list of member records."""
+        return cls(
+            member_ids=[d.member_id for d in records],
+            timestamps=[d.timestamp for d in records],
+            consumption=[d.consumption for d in records],
+            generation=[d.generation for d in records]
+        )
+    
+    def _select(self, index) -> Dict[str, np.ndarray]:
+        return {
+            "member_id": self.member_ids[index],
+            "timestamp": self.timestamps[index],
+            "consumption": self.consumption[index],
+            "generation": self.generation[index]
+        }
+    
+    def get_member_data(self, member_id: str) -> Dict[str, np.ndarray]:
+        """Get all data for a specific member."""
+        return self._select(self.member_ids == member_id)
+    
+    def get_timerange_data(self, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+        """Get data within a specific time range (views, no copy)."""
+        lo = np.searchsorted(self.timestamps, np.datetime64(_utc_naive(start), "ns"), side="left")
+        hi = np.searchsorted(self.timestamps, np.datetime64(_utc_naive(end), "ns"), side="right")
+        return self._select(slice(lo, hi))
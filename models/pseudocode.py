@@ -1,7 +1,8 @@
 """
 Data models for pseudocode representation.
 """
-from typing import List, Optional, Dict
+from dataclasses import dataclass
+from typing import Annotated, List, Optional, Dict
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -16,12 +17,13 @@ class StatementType(str, Enum):
     COMMENT = "comment"
 
 
-class PseudocodeStatement(BaseModel):
-    """A single pseudocode statement."""
+@dataclass(slots=True)
+class PseudocodeStatement:
+    """A single pseudocode statement (validated by pydantic inside a PseudocodeFunction)."""
     line_number: int
     type: StatementType
-    content: str = Field(..., description="The pseudocode line")
-    indentation_level: int = Field(default=0)
+    content: Annotated[str, Field(description="The pseudocode line")]
+    indentation_level: int = 0
     comment: Optional[str] = None
 
 
@@ -83,6 +85,16 @@ class Pseudocode(BaseModel):
         """Convert pseudocode to markdown format."""
         lines = [f"# {self.model_name} - Pseudocode\n"]
         
+        # Indent strings are built once per level, not once per statement; negative
+        # levels are not indented, as with "  " * level
+        max_level = max(
+            (stmt.indentation_level
+             for func in [*self.functions, self.main_algorithm]
+             for stmt in func.statements),
+            default=0
+        )
+        indents = ["  " * level for level in range(max_level + 1)]
+        
         if self.constants:
             lines.append("## Constants")
             for name, value in self.constants.items():
@@ -101,16 +113,12 @@ class Pseudocode(BaseModel):
             lines.append(f"**Inputs**: {', '.join(func.inputs)}")
             lines.append(f"**Outputs**: {', '.join(func.outputs)}")
             lines.append("\n```")
-            for stmt in func.statements:
-                indent = "  " * stmt.indentation_level
-                lines.append(f"{indent}{stmt.content}")
+            lines.extend(f"{indents[max(stmt.indentation_level, 0)]}{stmt.content}" for stmt in func.statements)
             lines.append("```\n")
         
         lines.append("## Main Algorithm")
         lines.append("```")
-        for stmt in self.main_algorithm.statements:
-            indent = "  " * stmt.indentation_level
-            lines.append(f"{indent}{stmt.content}")
+        lines.extend(f"{indents[max(stmt.indentation_level, 0)]}{stmt.content}" for stmt in self.main_algorithm.statements)
         lines.append("```")
         
         return "\n".join(lines)